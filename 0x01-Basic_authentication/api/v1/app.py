@@ -3,7 +3,7 @@
 Route module for the API
 """
 from os import getenv
-from api.v1.auth.auth import Auth
+from api.v1.auth.auth import Auth, PathMatcher
 from api.v1.auth.basic_auth import BasicAuth
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
@@ -14,6 +14,11 @@ app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 auth = None
 Auth_type = getenv('AUTH_TYPE')
+EXCLUDED_PATHS = PathMatcher([
+    '/api/v1/status/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/',
+])
 
 if Auth_type == "auth":
     auth = Auth()
@@ -47,12 +52,7 @@ def before_request_handler() -> str:
     """ Filtering method
     """
     if auth:
-        ex_paths = [
-            '/api/v1/status/',
-            '/api/v1/unauthorized/',
-            '/api/v1/forbidden/',
-        ]
-        if auth.require_auth(request.path, ex_paths):
+        if auth.require_auth(request.path, EXCLUDED_PATHS):
             if auth.authorization_header(request) is None:
                 abort(401)
             if auth.current_user(request) is None:
@@ -6,6 +6,57 @@ from flask import request
 from typing import List, TypeVar
 
 
+class PathMatcher:
+    """
+    Excluded paths compiled once: a set of the exact paths and a prefix
+    trie of the wildcard ones, so a match costs the same whatever the
+    number of rules
+    """
+    def __init__(self, excluded_paths: List[str]):
+        """
+        Args:
+        - excluded_paths(List of str): exact paths (trailing slashes
+          ignored) or prefixes ending with '*'
+        """
+        self.excluded_paths = list(excluded_paths)
+        self._exact = set()
+        self._prefixes = {}
+        for exc in self.excluded_paths:
+            if exc.endswith('*'):
+                node = self._prefixes
+                for char in exc[:-1]:
+                    node = node.setdefault(char, {})
+                node[None] = True
+            else:
+                self._exact.add(exc.rstrip('/'))
+
+    def __len__(self) -> int:
+        """
+        return:
+        - number of excluded paths
+        """
+        return len(self.excluded_paths)
+
+    def match(self, path: str) -> bool:
+        """
+        Args:
+        - path(str) without its trailing slash
+
+        return:
+        - True if the path is excluded
+        """
+        if path in self._exact:
+            return True
+        node = self._prefixes
+        for char in path:
+            if None in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return None in node
+
+
 class Auth:
     """
     class Auth definition
@@ -14,7 +65,7 @@ class Auth:
         """
         Args:
         - path(str)
-        - excluded_paths(List of str)
+        - excluded_paths(List of str, or PathMatcher compiled once)
 
         return:
         boolian value
@@ -25,6 +76,9 @@ class Auth:
         if path.endswith('/'):
             path = path[:-1]
 
+        if isinstance(excluded_paths, PathMatcher):
+            return not excluded_paths.match(path)
+
         for exc in excluded_paths:
             if exc.endswith('*'):
                 if path.startswith(exc[:-1]):
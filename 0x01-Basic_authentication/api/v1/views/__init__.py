@@ -9,3 +9,10 @@ from api.v1.views.index import *
 from api.v1.views.users import *
 
 User.load_from_file()
+
+
+@app_views.before_app_request
+def refresh_models() -> None:
+    """ Pick up the users created, updated or deleted by other workers
+    """
+    User.refresh()
@@ -2,18 +2,60 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, jsonify, request, url_for
 from models.user import User
+import json
+
+
+PAGE_MAX = 1000
+
+
+def stream_users():
+    """ Yield the JSON array of all users, one page of users at a time
+    """
+    yield '['
+    separator = ''
+    users = User.page(None, PAGE_MAX)
+    while users:
+        for user in users:
+            yield separator + json.dumps(user.to_json())
+            separator = ','
+        users = User.page(users[-1].id, PAGE_MAX)
+    yield ']'
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (optional):
+      - limit: number of users per page (at most 1000)
+      - cursor: ID after which the page starts
+      - stream: 1 to stream the list of all users
     Return:
-      - list of all User objects JSON represented
+      - list of all User objects JSON represented, ordered by ID when
+        paginated, with a Link header to the next page if any
+      - 400 if limit isn't valid
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    if request.args.get('stream') == '1':
+        return Response(stream_users(), mimetype='application/json')
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    if limit is None and cursor is None:
+        all_users = [user.to_json() for user in User.all()]
+        return jsonify(all_users)
+    try:
+        limit = int(limit) if limit is not None else PAGE_MAX
+    except ValueError:
+        limit = 0
+    if limit < 1 or limit > PAGE_MAX:
+        return jsonify({'error': "limit must be between 1 and {}"
+                        .format(PAGE_MAX)}), 400
+    users = User.page(cursor, limit)
+    response = jsonify([user.to_json() for user in users])
+    if len(users) == limit:
+        response.headers['Link'] = '<{}>; rel="next"'.format(url_for(
+            'app_views.view_all_users', limit=limit, cursor=users[-1].id))
+    return response
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
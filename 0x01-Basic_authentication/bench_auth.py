@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+""" Cost of Auth.require_auth per request as the excluded paths grow
+
+Usage: python3 bench_auth.py [number of excluded paths ...]
+"""
+import sys
+import timeit
+from api.v1.auth.auth import Auth, PathMatcher
+
+
+def excluded_paths(count: int) -> list:
+    """ count excluded paths, half exact and half wildcard
+    """
+    paths = []
+    for i in range(count):
+        if i % 2:
+            paths.append('/api/v1/public{}/*'.format(i))
+        else:
+            paths.append('/api/v1/static{}/'.format(i))
+    return paths
+
+
+def per_call(auth: Auth, paths, number: int = 20000) -> float:
+    """ Microseconds per require_auth call on a path matching no rule
+    """
+    seconds = timeit.timeit(
+        lambda: auth.require_auth('/api/v1/users/1234', paths),
+        number=number)
+    return seconds / number * 1e6
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [4, 64, 1024]
+    auth = Auth()
+    for count in counts:
+        paths = excluded_paths(count)
+        print("{} paths: {:.2f} us per call, {:.2f} us compiled".format(
+            count, per_call(auth, paths), per_call(auth, PathMatcher(paths))))
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+""" Load throughput of User.load_from_file
+
+Usage: python3 bench_load.py [count ...]
+"""
+import os
+import sys
+import tempfile
+from models.engine import json_storage
+from models.engine.json_storage import DATA, LOAD_STATS
+from models.user import User
+
+
+def records_per_sec(count: int) -> float:
+    """ Records loaded per second from a snapshot of count users
+    """
+    DATA['User'] = {}
+    for i in range(count):
+        user = User(email="user{}@holberton.io".format(i),
+                    first_name="First{}".format(i))
+        user.password = "pwd{}".format(i)
+        DATA['User'][user.id] = user
+    User.save_to_file()
+    DATA['User'] = {}
+    User.load_from_file()
+    return LOAD_STATS['User']['records_per_sec']
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [100000, 1000000]
+    os.chdir(tempfile.mkdtemp())
+    for count in counts:
+        print("{} users: {:.0f} records/sec ({} workers)".format(
+            count, records_per_sec(count), json_storage.LOAD_WORKERS))
+        os.remove(".db_User.json")
@@ -1,40 +1,138 @@
 #!/usr/bin/env python3
 """ Base module
 """
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import TypeVar, List, Iterable
-from os import path
-import json
+from os import getenv
+from models.engine.storage import Storage
+from models.engine.json_storage import DATA, JsonStorage
+from models.engine.sqlite_storage import SQLiteStorage
+from models.loader import TIMESTAMPS, parse_timestamp
+import calendar
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
-DATA = {}
+EPOCH = datetime(1970, 1, 1)
+
+# Storage engine: "json" (objects in memory, .db_<Class>.json files)
+# or "sqlite" (objects on disk in DB_SQLITE_PATH)
+ENGINE = getenv("DB_ENGINE", "json")
+STORAGE = None
+
+
+def storage() -> Storage:
+    """ Storage engine of the models, created on first use
+    """
+    global STORAGE
+    if STORAGE is None:
+        if ENGINE == "sqlite":
+            STORAGE = SQLiteStorage(getenv("DB_SQLITE_PATH", ".db.sqlite3"))
+        else:
+            STORAGE = JsonStorage()
+    return STORAGE
+
+
+def to_timestamp(value: datetime) -> int:
+    """ Seconds since the epoch of a naive UTC datetime
+    """
+    return calendar.timegm(value.utctimetuple())
 
 
 class Base():
     """ Base class
+
+    Attributes live in __slots__ and timestamps are kept as epoch
+    seconds, so a stored object carries no per-instance __dict__
     """
+    __slots__ = ('id', '_created_at', '_updated_at')
+    # Indexed attributes, mapped to True when values must be unique
+    _indexes = {}
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
-        s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
-
-        self.id = kwargs.get('id', str(uuid.uuid4()))
+        self.id = kwargs.get('id') or str(uuid.uuid4())
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self._created_at = parse_timestamp(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self._updated_at = parse_timestamp(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
+    @property
+    def created_at(self) -> datetime:
+        """ Getter of the creation date
+        """
+        return EPOCH + timedelta(seconds=self._created_at)
+
+    @created_at.setter
+    def created_at(self, value: datetime):
+        """ Setter of the creation date
+        """
+        self._created_at = to_timestamp(value)
+
+    @property
+    def updated_at(self) -> datetime:
+        """ Getter of the last update date
+        """
+        return EPOCH + timedelta(seconds=self._updated_at)
+
+    @updated_at.setter
+    def updated_at(self, value: datetime):
+        """ Setter of the last update date
+        """
+        self._updated_at = to_timestamp(value)
+
+    @classmethod
+    def fields(cls) -> List[str]:
+        """ Names of the attributes serialized by to_json
+        """
+        if '_fields' not in cls.__dict__:
+            slots = []
+            for klass in reversed(cls.__mro__):
+                slots.extend(klass.__dict__.get('__slots__', ()))
+            cls._slots = tuple(slots)
+            cls._fields = tuple(name[1:] if name[1:] in TIMESTAMPS
+                                else name for name in slots)
+        return cls._fields
+
+    @classmethod
+    def from_row(cls, row: list) -> TypeVar('Base'):
+        """ Build an object from a row made by to_row() or models.loader
+
+        Slots are filled directly, without going through __init__
+        """
+        cls.fields()
+        obj = cls.__new__(cls)
+        setattr_ = object.__setattr__
+        for name, value in zip(cls._slots, row):
+            setattr_(obj, name, value)
+        if obj.id is None:
+            object.__setattr__(obj, 'id', str(uuid.uuid4()))
+        if row[-1] and hasattr(obj, '__dict__'):
+            for name, value in row[-1].items():
+                object.__setattr__(obj, name, value)
+        return obj
+
+    def to_row(self) -> list:
+        """ Slot values in fields() order, then the __dict__ or None
+        """
+        self.fields()
+        row = [getattr(self, name, None) for name in self._slots]
+        row.append(dict(self.__dict__) if hasattr(self, '__dict__')
+                   and self.__dict__ else None)
+        return row
+
+    def __setattr__(self, name: str, value):
+        """ Keep secondary indexes up to date on assignment
+        """
+        if name in self._indexes:
+            storage().on_assign(self, name, value)
+        super().__setattr__(name, value)
+
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
         """
@@ -48,7 +146,10 @@ class Base():
         """ Convert the object a JSON dictionary
         """
         result = {}
-        for key, value in self.__dict__.items():
+        items = [(key, getattr(self, key, None)) for key in self.fields()]
+        if hasattr(self, '__dict__'):
+            items.extend(self.__dict__.items())
+        for key, value in items:
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -61,78 +162,59 @@ class Base():
     def load_from_file(cls):
         """ Load all objects from file
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
+        storage().load(cls)
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+    @classmethod
+    def refresh(cls):
+        """ Pick up the objects changed by other processes
+        """
+        storage().refresh(cls)
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
-
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+        storage().dump(cls)
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        storage().save(self)
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        storage().remove(self)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
-        s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return storage().count(cls)
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
         """ Return all objects
         """
-        return cls.search()
+        return storage().all(cls)
 
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return storage().get(cls, id)
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
         """
-        s_class = cls.__name__
-
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
+        return storage().search(cls, attributes)
 
-        return list(filter(_search, DATA[s_class].values()))
+    @classmethod
+    def page(cls, after: str = None,
+             limit: int = 100) -> List[TypeVar('Base')]:
+        """ Return at most limit objects with an ID greater than after,
+        ordered by ID
+        """
+        return storage().page(cls, after, limit)
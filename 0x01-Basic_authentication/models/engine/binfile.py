@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+""" BinFile module: binary snapshot with O(1) access by id
+
+Layout:
+- MAGIC, header length (u32), header: JSON {"fields": [...], "count": n}
+- records: length (u32) then a compact JSON array of the field values
+  (timestamps as epoch seconds), followed by the extra attributes or null
+- index: hash table of (id hash u64, record offset u64) slots,
+  probed linearly, an offset of 0 marks an empty slot
+- footer: index offset (u64), number of slots (u64), MAGIC
+"""
+from typing import Iterable, List
+import hashlib
+import json
+import mmap
+import struct
+
+
+MAGIC = b'HBDBIN01'
+U32 = struct.Struct('<I')
+SLOT = struct.Struct('<QQ')
+FOOTER = struct.Struct('<QQ8s')
+
+
+def id_hash(obj_id: str) -> int:
+    """ Non-zero 64 bits hash of an id
+    """
+    digest = hashlib.blake2b(obj_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') or 1
+
+
+def is_binfile(file_path: str) -> bool:
+    """ True if a file starts with the BinFile magic
+    """
+    with open(file_path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write(file_path: str, fields: List[str], rows: Iterable[list]):
+    """ Write rows (field values then extras) to a new BinFile
+
+    The first field must be the id
+    """
+    rows = list(rows)
+    header = json.dumps({'fields': list(fields),
+                         'count': len(rows)}).encode()
+    size = 2
+    while size < 2 * len(rows):
+        size *= 2
+    table = bytearray(size * SLOT.size)
+    with open(file_path, 'wb') as f:
+        f.write(MAGIC + U32.pack(len(header)) + header)
+        offset = f.tell()
+        for row in rows:
+            payload = json.dumps(row, separators=(',', ':')).encode()
+            f.write(U32.pack(len(payload)) + payload)
+            h = id_hash(row[0])
+            slot = h & (size - 1)
+            while SLOT.unpack_from(table, slot * SLOT.size)[1]:
+                slot = (slot + 1) & (size - 1)
+            SLOT.pack_into(table, slot * SLOT.size, h, offset)
+            offset += U32.size + len(payload)
+        f.write(table)
+        f.write(FOOTER.pack(offset, size, MAGIC))
+        f.flush()
+
+
+class BinFile():
+    """ Read-only, memory-mapped view of a BinFile
+    """
+
+    def __init__(self, file_path: str):
+        """ Map a BinFile
+        """
+        with open(file_path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise ValueError("{} is not a BinFile".format(file_path))
+        header_len = U32.unpack_from(self._map, len(MAGIC))[0]
+        start = len(MAGIC) + U32.size
+        header = json.loads(self._map[start:start + header_len])
+        self.fields = header['fields']
+        self.count = header['count']
+        self._records = start + header_len
+        self._index, self._size, magic = FOOTER.unpack_from(
+            self._map, len(self._map) - FOOTER.size)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError("{} is truncated".format(file_path))
+
+    def close(self):
+        """ Unmap the file
+        """
+        self._map.close()
+
+    def __enter__(self):
+        """ Context manager entry
+        """
+        return self
+
+    def __exit__(self, *args):
+        """ Context manager exit
+        """
+        self.close()
+
+    def __len__(self) -> int:
+        """ Number of records
+        """
+        return self.count
+
+    def record(self, offset: int) -> list:
+        """ Row stored at an offset
+        """
+        length = U32.unpack_from(self._map, offset)[0]
+        start = offset + U32.size
+        return json.loads(self._map[start:start + length])
+
+    def get(self, obj_id: str) -> list:
+        """ Row of an id, or None, reading only its index slots and record
+        """
+        h = id_hash(obj_id)
+        slot = h & (self._size - 1)
+        while True:
+            slot_h, offset = SLOT.unpack_from(
+                self._map, self._index + slot * SLOT.size)
+            if offset == 0:
+                return None
+            if slot_h == h:
+                row = self.record(offset)
+                if row[0] == obj_id:
+                    return row
+            slot = (slot + 1) & (self._size - 1)
+
+    def rows(self) -> List[list]:
+        """ Every row, decoded with one JSON parse
+        """
+        payloads = []
+        offset = self._records
+        while offset < self._index:
+            length = U32.unpack_from(self._map, offset)[0]
+            start = offset + U32.size
+            payloads.append(self._map[start:start + length])
+            offset = start + length
+        return json.loads(b'[' + b','.join(payloads) + b']')
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+""" FileLock module
+"""
+import fcntl
+import threading
+
+
+class FileLock():
+    """ Lock shared by the threads of a process and by every process
+    opening the same lock file
+
+    The lock is reentrant within a thread: only the outermost
+    acquisition takes the flock
+    """
+
+    def __init__(self, lock_path: str):
+        """ Initialize a FileLock
+        """
+        self.lock_path = lock_path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        """ Acquire the lock
+        """
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                self._file = open(self.lock_path, 'a')
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *args):
+        """ Release the lock
+        """
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._lock.release()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+""" RWLock module
+"""
+from contextlib import contextmanager
+import threading
+
+
+class RWLock():
+    """ Readers/writer lock: many readers or one writer
+
+    Waiting writers go first, so a steady flow of readers
+    can not starve them. The lock is not reentrant
+    """
+
+    def __init__(self):
+        """ Initialize a RWLock
+        """
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        """ Hold the lock as a reader
+        """
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        """ Hold the lock as the writer
+        """
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
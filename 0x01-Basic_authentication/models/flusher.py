@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+""" Flusher module
+"""
+from typing import Callable
+import threading
+
+
+class Flusher(threading.Thread):
+    """ Background thread coalescing many changes into one write
+
+    Each dirty key is flushed once per interval, or as soon as it
+    collects `batch` changes (0 disables the batch trigger)
+    """
+
+    def __init__(self, interval: float = 1.0, batch: int = 0):
+        """ Initialize a Flusher
+        """
+        super().__init__(name="flusher", daemon=True)
+        self.interval = interval
+        self.batch = batch
+        self.flushes = 0
+        self.changes = 0
+        self._cond = threading.Condition()
+        self._flushing = threading.Lock()
+        self._dirty = {}
+
+    def mark(self, key: str, flush_fn: Callable[[], None]):
+        """ Record one change on key, flushed later by flush_fn
+        """
+        with self._cond:
+            entry = self._dirty.setdefault(key, [flush_fn, 0])
+            entry[1] += 1
+            if self.batch and entry[1] >= self.batch:
+                self._cond.notify()
+
+    def pending(self) -> int:
+        """ Number of changes not written yet
+        """
+        with self._cond:
+            return sum(count for _, count in self._dirty.values())
+
+    def run(self):
+        """ Flush every interval or on a full batch
+        """
+        while True:
+            with self._cond:
+                self._cond.wait(self.interval)
+            self.flush()
+
+    def flush(self):
+        """ Write every dirty key now
+        """
+        with self._flushing:
+            with self._cond:
+                dirty, self._dirty = self._dirty, {}
+            for key, (flush_fn, count) in dirty.items():
+                try:
+                    flush_fn()
+                except Exception:
+                    with self._cond:
+                        entry = self._dirty.setdefault(key, [flush_fn, 0])
+                        entry[1] += count
+                    continue
+                self.flushes += 1
+                self.changes += count
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+""" Loader module: fast decoding of .db_<Class>.json snapshots
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Tuple
+import json
+import os
+import time
+
+
+EPOCH = datetime(1970, 1, 1)
+SECOND = timedelta(seconds=1)
+TIMESTAMPS = ('created_at', 'updated_at')
+
+
+def parse_timestamp(value: str) -> int:
+    """ Epoch seconds of a "%Y-%m-%dT%H:%M:%S" string, without strptime
+    """
+    if len(value) != 19 or value[10] != 'T':
+        raise ValueError("bad timestamp {}".format(value))
+    return (datetime.fromisoformat(value) - EPOCH) // SECOND
+
+
+def decode(objs_json: List[dict], fields: Tuple[str]) -> List[list]:
+    """ Rows of field values, timestamps as epoch seconds
+
+    The last item of a row holds the keys that are not fields, or None
+    """
+    now = int(time.time())
+    stamps = [i for i, name in enumerate(fields) if name in TIMESTAMPS]
+    rows = []
+    for obj_json in objs_json:
+        row = [obj_json.pop(name, None) for name in fields]
+        for i in stamps:
+            row[i] = now if row[i] is None else parse_timestamp(row[i])
+        row.append(obj_json or None)
+        rows.append(row)
+    return rows
+
+
+def decode_range(file_path: str, start: int, end: int,
+                 fields: Tuple[str]) -> List[list]:
+    """ Decode the snapshot lines starting between two byte offsets
+    """
+    lines = []
+    with open(file_path, 'rb') as f:
+        if start > 0:
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() <= end:
+            line = f.readline()
+            if not line:
+                break
+            line = line.strip().rstrip(b',')
+            if line not in (b'', b'{', b'}'):
+                lines.append(line)
+    if not lines:
+        return []
+    objs_json = json.loads(b'{' + b','.join(lines) + b'}')
+    return decode(list(objs_json.values()), fields)
+
+
+def is_line_oriented(file_path: str) -> bool:
+    """ True if the snapshot holds one object per line
+    """
+    with open(file_path, 'rb') as f:
+        return f.readline() == b'{\n'
+
+
+def load_rows(file_path: str, fields: Tuple[str],
+              workers: int = 0, parallel_min: int = 0) -> List[list]:
+    """ Decode a whole snapshot into rows
+
+    Snapshots of at least parallel_min bytes, written one object per
+    line, are split in byte ranges decoded by a pool of processes
+    """
+    size = os.path.getsize(file_path)
+    if workers > 1 and size >= parallel_min and is_line_oriented(file_path):
+        step = size // workers + 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = pool.map(decode_range,
+                              [file_path] * workers,
+                              [i * step for i in range(workers)],
+                              [(i + 1) * step - 1 for i in range(workers)],
+                              [fields] * workers)
+            return [row for chunk in chunks for row in chunk]
+    with open(file_path, 'rb') as f:
+        objs_json = json.load(f)
+    return decode(list(objs_json.values()), fields)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+""" Stress test of the /api/v1/users endpoints from many threads
+
+Usage: python3 stress_users.py [threads] [requests per thread]
+"""
+import os
+import sys
+import tempfile
+import threading
+
+
+def worker(app, n: int, errors: list):
+    """ Create, read, update, list and delete users
+    """
+    client = app.test_client()
+    for i in range(n):
+        try:
+            r = client.post('/api/v1/users', json={
+                'email': "{}-{}@holberton.io".format(
+                    threading.get_ident(), i),
+                'password': "pwd"})
+            assert r.status_code == 201, r.status_code
+            user_id = r.get_json()['id']
+            r = client.put('/api/v1/users/{}'.format(user_id),
+                           json={'first_name': "F{}".format(i)})
+            assert r.status_code == 200, r.status_code
+            r = client.get('/api/v1/users/{}'.format(user_id))
+            assert r.get_json()['first_name'] == "F{}".format(i)
+            assert client.get('/api/v1/users').status_code == 200
+            if i % 2:
+                r = client.delete('/api/v1/users/{}'.format(user_id))
+                assert r.status_code == 200, r.status_code
+        except Exception as e:
+            errors.append(repr(e))
+
+
+if __name__ == "__main__":
+    n_threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    n_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    os.environ.pop('AUTH_TYPE', None)
+    os.chdir(tempfile.mkdtemp())
+    from api.v1.app import app
+    from models.user import User
+
+    errors = []
+    threads = [threading.Thread(target=worker,
+                                args=(app, n_requests, errors))
+               for _ in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    expected = n_threads * (n_requests - n_requests // 2)
+    in_memory = User.count()
+    User.save_to_file()
+    User.load_from_file()
+    print("errors: {}".format(len(errors)))
+    for error in errors[:10]:
+        print("  {}".format(error))
+    print("users: {} expected, {} in memory, {} reloaded".format(
+        expected, in_memory, User.count()))
+    sys.exit(1 if errors or not expected == in_memory == User.count()
+             else 0)
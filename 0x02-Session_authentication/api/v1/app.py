@@ -3,9 +3,12 @@
 Route module for the API
 """
 from os import getenv
-from api.v1.auth.auth import Auth
+import time
+from api.v1.auth.auth import Auth, PathMatcher
 from api.v1.auth.basic_auth import BasicAuth
 from api.v1.auth.session_auth import SessionAuth
+from api.v1.auth.session_exp_auth import SessionExpAuth
+from api.v1.auth.session_token_auth import SessionTokenAuth
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import CORS
@@ -15,6 +18,12 @@ app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 auth = None
 Auth_type = getenv('AUTH_TYPE')
+EXCLUDED_PATHS = PathMatcher([
+    '/api/v1/status/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/',
+    '/api/v1/auth_session/login/',
+])
 
 if Auth_type == "auth":
     auth = Auth()
@@ -22,6 +31,10 @@ elif Auth_type == "basic_auth":
     auth = BasicAuth()
 elif Auth_type == "session_auth":
     auth = SessionAuth()
+elif Auth_type == "session_exp_auth":
+    auth = SessionExpAuth()
+elif Auth_type == "session_token_auth":
+    auth = SessionTokenAuth()
 
 
 @app.errorhandler(404)
@@ -47,24 +60,38 @@ def forbidden(error) -> str:
 
 @app.before_request
 def before_request_handler() -> str:
-    """ Filtering method
+    """ Filtering method: resolves the user of the request once, with
+    request.auth, into request.current_user, with the mechanism that
+    authenticated them in request.auth_mechanism and the time it took
+    in request.auth_time
     """
+    request.auth = auth
+    request.current_user = None
+    request.auth_mechanism = None
+    request.auth_time = 0.0
     if auth:
-        ex_paths = [
-            '/api/v1/status/',
-            '/api/v1/unauthorized/',
-            '/api/v1/forbidden/',
-            '/api/v1/auth_session/login/',
-        ]
-        if auth.require_auth(request.path, ex_paths):
-            request.current_user = auth.current_user(request)
-            if auth.authorization_header(request) is None:
-                abort(401)
-            if auth.authorization_header(request) is None \
-                    and auth.session_cookie(request) is None:
-                abort(401)
-            if auth.current_user(request) is None:
+        if auth.require_auth(request.path, EXCLUDED_PATHS):
+            start = time.perf_counter()
+            try:
+                if auth.authorization_header(request) is None \
+                        and auth.session_cookie(request) is None:
+                    abort(401)
+                request.current_user = auth.current_user(request)
+            finally:
+                request.auth_time = time.perf_counter() - start
+            if request.current_user is None:
                 abort(403)
+            request.auth_mechanism = Auth_type
+
+
+@app.after_request
+def after_request_handler(response):
+    """ Reports the time spent authenticating the request
+    """
+    if auth:
+        response.headers.add('Server-Timing', 'auth;dur={:.3f}'.format(
+            getattr(request, 'auth_time', 0.0) * 1000))
+    return response
 
 
 if __name__ == "__main__":
@@ -5,12 +5,95 @@ BasicAuth module
 import re
 import base64
 import binascii
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from os import getenv
 from typing import Tuple, TypeVar
 
 from api.v1.auth.auth import Auth
 from models.user import User
 
 
+CACHE_SIZE = int(getenv("BASIC_AUTH_CACHE_SIZE", "1024"))
+CACHE_TTL = float(getenv("BASIC_AUTH_CACHE_TTL", "60"))
+
+
+class CredentialCache():
+    """
+    Authorization headers already verified, mapped to their user
+
+    Keys are HMAC digests of the headers (with a key drawn at startup),
+    so the credentials themselves are never kept. Entries expire after
+    ttl seconds, in insertion order, and the oldest are dropped beyond
+    size entries
+    """
+    def __init__(self, size: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        """ Initialize a CredentialCache
+        """
+        self.size = size
+        self.ttl = ttl
+        self._key = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def digest(self, authorization_header: str) -> bytes:
+        """ Keyed digest of an Authorization header
+        """
+        return hmac.new(self._key, authorization_header.encode(),
+                        hashlib.sha256).digest()
+
+    def get(self, authorization_header: str) -> TypeVar('User'):
+        """ User of a verified header, if their email and password
+        haven't changed since and they still exist
+        """
+        key = self.digest(authorization_header)
+        now = time.monotonic()
+        with self._lock:
+            while self._entries:
+                oldest = next(iter(self._entries.values()))
+                if oldest[3] > now:
+                    break
+                self._entries.popitem(last=False)
+            entry = self._entries.get(key)
+        if entry is not None:
+            user_id, email, password, expires = entry
+            user = User.get(user_id)
+            if user is not None and user.email == email and \
+               user.password == password:
+                self.hits += 1
+                return user
+            with self._lock:
+                self._entries.pop(key, None)
+        self.misses += 1
+        return None
+
+    def put(self, authorization_header: str, user: TypeVar('User')):
+        """ Remember the user a header was verified for
+        """
+        if self.size <= 0:
+            return
+        key = self.digest(authorization_header)
+        entry = (user.id, user.email, user.password,
+                 time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """ Forget every entry
+        """
+        with self._lock:
+            self._entries.clear()
+
+
 class BasicAuth(Auth):
     """
     BasicAuth definition
@@ -84,9 +167,15 @@ class BasicAuth(Auth):
 
         return None
 
+    cache = CredentialCache()
+
     def current_user(self, request=None) -> User:
         """Retrieves the user"""
         auth_header = self.authorization_header(request)
+        if auth_header and isinstance(auth_header, str):
+            user = self.cache.get(auth_header)
+            if user is not None:
+                return user
         base64_header = self.extract_base64_authorization_header(auth_header)
         decoded_header = self.decode_base64_authorization_header(base64_header)
 
@@ -96,4 +185,7 @@ class BasicAuth(Auth):
         user_email, user_pwd = self.extract_user_credentials(decoded_header)
         if not user_email or not user_pwd:
             return None
-        return self.user_object_from_credentials(user_email, user_pwd)
+        user = self.user_object_from_credentials(user_email, user_pwd)
+        if user is not None:
+            self.cache.put(auth_header, user)
+        return user
@@ -1,13 +1,37 @@
 #!/usr/bin/env python3
 """ Class SessionAuth module """
 from api.v1.auth.auth import Auth
+from api.v1.auth.session_store import SessionStore, session_store
+from datetime import datetime
 from models.user import User
+import time
 import uuid
 
 
+PURGE_BATCH = 100
+PURGE_INTERVAL = 1.0
+
+
 class SessionAuth(Auth):
-    """ Class SessionAuth definition """
+    """ Class SessionAuth definition
+
+    Sessions are kept in the store selected by SESSION_STORE, in memory
+    by default: user_id_by_session_id maps each Session ID to its User
+    ID, and session_ids_by_user_id indexes it
+    """
     user_id_by_session_id = {}
+    session_ids_by_user_id = {}
+    purged_at = 0.0
+
+    def __init__(self):
+        """ Opens the session store """
+        self.store = self.open_store()
+
+    def open_store(self) -> SessionStore:
+        """ returns the session store, over the class attributes when
+        it is in memory """
+        return session_store(self.user_id_by_session_id,
+                             self.session_ids_by_user_id, user_ids=True)
 
     def create_session(self, user_id: str = None) -> str:
         """ creates a Session ID for a user_id """
@@ -15,7 +39,10 @@ class SessionAuth(Auth):
             return None
 
         session_id = str(uuid.uuid4())
-        self.user_id_by_session_id[session_id] = user_id
+        self.store.set(session_id, {
+            'user_id': user_id,
+            'created_at': datetime.now(),
+        })
         return session_id
 
     def user_id_for_session_id(self, session_id: str = None) -> str:
@@ -23,7 +50,36 @@ class SessionAuth(Auth):
         if session_id is None or not isinstance(session_id, str):
             return None
 
-        return self.user_id_by_session_id.get(session_id)
+        session = self.store.get(session_id)
+        if session is None:
+            return None
+        return session.get('user_id')
+
+    def user_session_ids(self, user_id: str = None) -> list:
+        """ returns the Session IDs of a user """
+        if user_id is None or not isinstance(user_id, str):
+            return []
+        return self.store.sessions_of(user_id)
+
+    def count_user_sessions(self, user_id: str = None) -> int:
+        """ returns the number of sessions of a user """
+        return len(self.user_session_ids(user_id))
+
+    def destroy_user_sessions(self, user_id: str = None) -> int:
+        """ deletes every session of a user, returns how many """
+        if user_id is None or not isinstance(user_id, str):
+            return 0
+        return self.store.delete_user(user_id)
+
+    def purge_sessions(self, before: datetime) -> int:
+        """ deletes at most PURGE_BATCH sessions created before a time,
+        at most once every PURGE_INTERVAL seconds (a SQLite DELETE
+        takes the write lock even when it deletes nothing) """
+        now = time.monotonic()
+        if now - type(self).purged_at < PURGE_INTERVAL:
+            return 0
+        type(self).purged_at = now
+        return self.store.purge(before, PURGE_BATCH)
 
     def current_user(self, request=None):
         """ returns a User instance based on a cookie value """
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+""" Class SessionExpAuth module """
+from api.v1.auth.session_auth import SessionAuth
+from api.v1.auth.session_store import SessionStore, session_store
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from os import getenv
+import heapq
+import threading
+
+
+EVICT_BATCH = 8
+
+
+class SessionExpAuth(SessionAuth):
+    """ Class SessionExpAuth definition
+
+    Sessions expire SESSION_DURATION seconds after their creation (never
+    if it isn't a positive number). Their expiry times are kept in a
+    heap, and each call evicts at most EVICT_BATCH expired sessions from
+    its top, so no call ever sweeps all the sessions. Beyond SESSION_MAX
+    sessions (if positive), the least recently used ones are evicted,
+    and the heap is rebuilt without them once they fill half of it.
+
+    With a store shared by several processes, each one evicts the
+    sessions it created, and expired sessions created by the others
+    are dropped when they are looked up. The expired sessions no
+    process evicts (their worker restarted, and they are never looked
+    up again) are purged from the shared store, PURGE_BATCH at a time.
+
+    In memory, user_id_by_session_id maps each Session ID to a session
+    dictionary: its 'user_id' and the datetime it was 'created_at'
+    """
+    user_id_by_session_id = {}
+    session_ids_by_user_id = {}
+    recent = OrderedDict()
+    expiry_heap = []
+    evictions = {'expired': 0, 'capacity': 0, 'purged': 0}
+    lock = threading.Lock()
+
+    def __init__(self):
+        """ Reads the session duration and the maximum number of sessions
+        """
+        super().__init__()
+        try:
+            self.session_duration = int(getenv('SESSION_DURATION', '0'))
+        except ValueError:
+            self.session_duration = 0
+        try:
+            self.session_max = int(getenv('SESSION_MAX', '0'))
+        except ValueError:
+            self.session_max = 0
+
+    def open_store(self) -> SessionStore:
+        """ returns the session store, holding the session dictionaries
+        in the class attributes when it is in memory """
+        return session_store(self.user_id_by_session_id,
+                             self.session_ids_by_user_id)
+
+    def create_session(self, user_id: str = None) -> str:
+        """ creates a Session ID for a user_id, with its creation time """
+        session_id = super().create_session(user_id)
+        if session_id is None:
+            return None
+        now = datetime.now()
+        with self.lock:
+            self.recent[session_id] = None
+            if self.session_duration > 0:
+                heapq.heappush(self.expiry_heap, (
+                    now + timedelta(seconds=self.session_duration),
+                    session_id))
+            self.evict(now)
+        return session_id
+
+    def user_id_for_session_id(self, session_id: str = None) -> str:
+        """ returns the User ID of a Session ID, unless it has expired """
+        if session_id is None or not isinstance(session_id, str):
+            return None
+
+        now = datetime.now()
+        with self.lock:
+            self.evict(now)
+        session = self.store.get(session_id)
+        if session is None:
+            return None
+        with self.lock:
+            if self.session_duration > 0 and session['created_at'] + \
+                    timedelta(seconds=self.session_duration) < now:
+                self.recent.pop(session_id, None)
+                if self.store.delete(session_id):
+                    self.evictions['expired'] += 1
+                return None
+            if session_id in self.recent:
+                self.recent.move_to_end(session_id)
+        return session.get('user_id')
+
+    def destroy_user_sessions(self, user_id: str = None) -> int:
+        """ deletes every session of a user, returns how many """
+        session_ids = self.user_session_ids(user_id)
+        with self.lock:
+            for session_id in session_ids:
+                self.recent.pop(session_id, None)
+        return super().destroy_user_sessions(user_id)
+
+    def evict(self, now: datetime):
+        """ evicts the first expired sessions, then the least recently
+        used ones beyond the maximum number of sessions (lock held) """
+        for _ in range(EVICT_BATCH):
+            if not self.expiry_heap or self.expiry_heap[0][0] > now:
+                break
+            expires_at, session_id = heapq.heappop(self.expiry_heap)
+            self.recent.pop(session_id, None)
+            if self.store.delete(session_id):
+                self.evictions['expired'] += 1
+        if self.session_max > 0:
+            while len(self.recent) > self.session_max:
+                session_id, _ = self.recent.popitem(last=False)
+                self.store.delete(session_id)
+                self.evictions['capacity'] += 1
+        if self.session_duration > 0 and self.store.shared:
+            self.evictions['purged'] += self.purge_sessions(
+                now - timedelta(seconds=self.session_duration))
+        if len(self.expiry_heap) > 2 * len(self.recent) + EVICT_BATCH:
+            self.expiry_heap[:] = [entry for entry in self.expiry_heap
+                                   if entry[1] in self.recent]
+            heapq.heapify(self.expiry_heap)
+
+    @classmethod
+    def stats(cls) -> dict:
+        """ returns the number of live sessions (created by this process)
+        and of evictions """
+        return {
+            'live': len(cls.recent),
+            'expired': cls.evictions['expired'],
+            'evicted': cls.evictions['capacity'],
+            'purged': cls.evictions['purged'],
+        }
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+""" Session stores module: where SessionAuth keeps its sessions
+
+A session is a dictionary with the 'user_id' it belongs to and the
+datetime it was 'created_at'
+"""
+from collections import OrderedDict
+from datetime import datetime
+from os import getenv
+from typing import List
+import sqlite3
+import threading
+import time
+
+
+class SessionStore():
+    """ Session store interface
+
+    shared is True if other processes see the same sessions
+    """
+    shared = False
+
+    def get(self, session_id: str) -> dict:
+        """ Session of a Session ID, or None
+        """
+        raise NotImplementedError()
+
+    def set(self, session_id: str, session: dict):
+        """ Store a session
+        """
+        raise NotImplementedError()
+
+    def delete(self, session_id: str) -> bool:
+        """ Remove a session, True if it existed
+        """
+        raise NotImplementedError()
+
+    def count(self) -> int:
+        """ Number of sessions
+        """
+        raise NotImplementedError()
+
+    def sessions_of(self, user_id: str) -> List[str]:
+        """ Session IDs of a user
+        """
+        raise NotImplementedError()
+
+    def delete_user(self, user_id: str) -> int:
+        """ Remove every session of a user, return how many
+        """
+        raise NotImplementedError()
+
+    def purge(self, before: datetime, limit: int) -> int:
+        """ Remove at most limit sessions created before a time, the
+        oldest first, return how many
+        """
+        raise NotImplementedError()
+
+
+class MemoryStore(SessionStore):
+    """ Sessions in a dictionary of the process: a local stand-in for
+    a key-value server
+
+    by_user indexes the Session IDs of each user. With user_ids, data
+    maps each Session ID to the bare User ID, and the sessions found
+    have no creation time
+    """
+
+    def __init__(self, data: dict = None, by_user: dict = None,
+                 user_ids: bool = False):
+        """ Initialize a MemoryStore over data and by_user
+        """
+        self.data = {} if data is None else data
+        self.by_user = {} if by_user is None else by_user
+        self.user_ids = user_ids
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> dict:
+        """ Session of a Session ID, or None
+        """
+        session = self.data.get(session_id)
+        if self.user_ids and session is not None:
+            return {'user_id': session}
+        return session
+
+    def set(self, session_id: str, session: dict):
+        """ Store a session
+        """
+        with self._lock:
+            self.unindex(session_id)
+            self.data[session_id] = \
+                session['user_id'] if self.user_ids else session
+            self.by_user.setdefault(
+                session['user_id'], set()).add(session_id)
+
+    def unindex(self, session_id: str) -> dict:
+        """ Remove a session and its index entry (lock held)
+        """
+        session = self.data.pop(session_id, None)
+        if session is not None:
+            user_id = session if self.user_ids else session['user_id']
+            session_ids = self.by_user.get(user_id)
+            if session_ids is not None:
+                session_ids.discard(session_id)
+                if not session_ids:
+                    del self.by_user[user_id]
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        """ Remove a session, True if it existed
+        """
+        with self._lock:
+            return self.unindex(session_id) is not None
+
+    def count(self) -> int:
+        """ Number of sessions
+        """
+        return len(self.data)
+
+    def sessions_of(self, user_id: str) -> List[str]:
+        """ Session IDs of a user
+        """
+        with self._lock:
+            return list(self.by_user.get(user_id, ()))
+
+    def delete_user(self, user_id: str) -> int:
+        """ Remove every session of a user, return how many
+        """
+        with self._lock:
+            session_ids = self.by_user.pop(user_id, ())
+            for session_id in session_ids:
+                self.data.pop(session_id, None)
+            return len(session_ids)
+
+    def purge(self, before: datetime, limit: int) -> int:
+        """ Remove at most limit sessions created before a time, the
+        oldest first: data is in the order the sessions were stored, so
+        only the sessions removed and the next one are read. Sessions
+        without a creation time are kept
+        """
+        if self.user_ids:
+            return 0
+        with self._lock:
+            expired = []
+            for session_id, session in self.data.items():
+                if len(expired) >= limit or session['created_at'] >= before:
+                    break
+                expired.append(session_id)
+            for session_id in expired:
+                self.unindex(session_id)
+            return len(expired)
+
+
+class SQLiteStore(SessionStore):
+    """ Sessions in a SQLite database file, shared by every process
+    opening it
+
+    The database runs in WAL mode so lookups never wait for the writer
+    """
+    shared = True
+
+    def __init__(self, db_path: str = ".db_sessions.sqlite3"):
+        """ Initialize a SQLiteStore
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """ Connection of the current thread
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, isolation_level=None,
+                                   timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions "
+                         "(id TEXT PRIMARY KEY, user_id TEXT NOT NULL, "
+                         "created_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_user_id "
+                         "ON sessions (user_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_created_at "
+                         "ON sessions (created_at)")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str) -> dict:
+        """ Session of a Session ID, or None
+        """
+        row = self.connection.execute(
+            "SELECT user_id, created_at FROM sessions WHERE id = ?",
+            (session_id,)).fetchone()
+        if row is None:
+            return None
+        return {'user_id': row[0],
+                'created_at': datetime.fromtimestamp(row[1])}
+
+    def set(self, session_id: str, session: dict):
+        """ Store a session
+        """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO sessions (id, user_id, created_at) "
+            "VALUES (?, ?, ?)",
+            (session_id, session['user_id'],
+             session['created_at'].timestamp()))
+
+    def delete(self, session_id: str) -> bool:
+        """ Remove a session, True if it existed
+        """
+        return self.connection.execute(
+            "DELETE FROM sessions WHERE id = ?",
+            (session_id,)).rowcount > 0
+
+    def count(self) -> int:
+        """ Number of sessions
+        """
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def sessions_of(self, user_id: str) -> List[str]:
+        """ Session IDs of a user, found through the user_id index
+        """
+        return [session_id for session_id, in self.connection.execute(
+            "SELECT id FROM sessions WHERE user_id = ?", (user_id,))]
+
+    def delete_user(self, user_id: str) -> int:
+        """ Remove every session of a user, return how many
+        """
+        return self.connection.execute(
+            "DELETE FROM sessions WHERE user_id = ?", (user_id,)).rowcount
+
+    def purge(self, before: datetime, limit: int) -> int:
+        """ Remove at most limit sessions created before a time, the
+        oldest first, in one statement on the created_at index
+        """
+        return self.connection.execute(
+            "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions "
+            "WHERE created_at < ? ORDER BY created_at LIMIT ?)",
+            (before.timestamp(), limit)).rowcount
+
+
+class CachedStore(SessionStore):
+    """ Read-through cache of the sessions of another store
+
+    Sessions found are kept for ttl seconds, up to size of them (the
+    oldest are dropped first). A session deleted by another process
+    may thus still be found here for up to ttl seconds
+    """
+
+    def __init__(self, store: SessionStore, size: int = 1024,
+                 ttl: float = 1.0):
+        """ Initialize a CachedStore in front of store
+        """
+        self.store = store
+        self.shared = store.shared
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cache(self, session_id: str, session: dict):
+        """ Keep a session for ttl seconds
+        """
+        with self._lock:
+            self._entries.pop(session_id, None)
+            self._entries[session_id] = (session, time.monotonic() + self.ttl)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def get(self, session_id: str) -> dict:
+        """ Session of a Session ID, or None
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and entry[1] < time.monotonic():
+                del self._entries[session_id]
+                entry = None
+        if entry is not None:
+            return entry[0]
+        session = self.store.get(session_id)
+        if session is not None:
+            self.cache(session_id, session)
+        return session
+
+    def set(self, session_id: str, session: dict):
+        """ Store a session
+        """
+        self.store.set(session_id, session)
+        self.cache(session_id, session)
+
+    def delete(self, session_id: str) -> bool:
+        """ Remove a session, True if it existed
+        """
+        with self._lock:
+            self._entries.pop(session_id, None)
+        return self.store.delete(session_id)
+
+    def count(self) -> int:
+        """ Number of sessions
+        """
+        return self.store.count()
+
+    def sessions_of(self, user_id: str) -> List[str]:
+        """ Session IDs of a user
+        """
+        return self.store.sessions_of(user_id)
+
+    def delete_user(self, user_id: str) -> int:
+        """ Remove every session of a user, return how many
+        """
+        session_ids = self.store.sessions_of(user_id)
+        with self._lock:
+            for session_id in session_ids:
+                self._entries.pop(session_id, None)
+        return self.store.delete_user(user_id)
+
+    def purge(self, before: datetime, limit: int) -> int:
+        """ Remove at most limit sessions created before a time, the
+        oldest first (they may still be found here for ttl seconds)
+        """
+        return self.store.purge(before, limit)
+
+
+def session_store(data: dict = None, by_user: dict = None,
+                  user_ids: bool = False) -> SessionStore:
+    """ Store selected by SESSION_STORE: "memory" (default, over data
+    and by_user, holding bare User IDs with user_ids) or "sqlite"
+    (SESSION_DB_PATH, behind a SESSION_CACHE_TTL cache)
+    """
+    if getenv("SESSION_STORE", "memory") == "sqlite":
+        return CachedStore(
+            SQLiteStore(getenv("SESSION_DB_PATH", ".db_sessions.sqlite3")),
+            int(getenv("SESSION_CACHE_SIZE", "1024")),
+            float(getenv("SESSION_CACHE_TTL", "1")))
+    return MemoryStore(data, by_user, user_ids)
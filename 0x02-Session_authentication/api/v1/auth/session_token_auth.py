@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+""" Class SessionTokenAuth module """
+from api.v1.auth.session_auth import SessionAuth
+from api.v1.auth.session_store import SessionStore, session_store
+from datetime import datetime, timedelta
+from os import getenv
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+import warnings
+
+
+def b64encode(data: bytes) -> str:
+    """ URL-safe base64 without padding """
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def b64decode(data: str) -> bytes:
+    """ Decodes URL-safe base64 without padding """
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+class SessionTokenAuth(SessionAuth):
+    """ Class SessionTokenAuth definition
+
+    The Session ID is a token carrying the user id, its issue time and
+    its expiry time (SESSION_DURATION seconds later, never if it isn't
+    a positive number), signed with HMAC-SHA256 and SESSION_SECRET.
+    Checking it needs no session store. Every process sharing the
+    secret accepts the tokens of the others: without SESSION_SECRET,
+    a random secret is drawn, only this process accepts its tokens, and
+    a RuntimeWarning says so.
+
+    With SESSION_REVOCATION=1, destroy_session() records the token in
+    the session store, destroy_user_sessions() records the time before
+    which the tokens of a user are revoked, and every token is checked
+    against both. Tokens aren't stored, so they can't be listed: in
+    memory, the store holds the revocations in their own attributes.
+    Across several processes, revocations need a shared store
+    (SESSION_STORE=sqlite): in memory, a token revoked by one process
+    is still accepted by the others, and a RuntimeWarning says so.
+    No token outlives SESSION_DURATION, so the revocations older than
+    that are purged, PURGE_BATCH at a time; without SESSION_DURATION,
+    tokens never expire and neither do their revocations
+    """
+    revocations = {}
+    revocations_by_user_id = {}
+
+    def __init__(self):
+        """ Reads the secret, the session duration and the revocation
+        option """
+        super().__init__()
+        secret = getenv('SESSION_SECRET')
+        if not secret:
+            warnings.warn("SESSION_SECRET is not set: tokens are signed "
+                          "with a random secret, other processes will "
+                          "refuse them", RuntimeWarning)
+        self.secret = secret.encode() if secret else os.urandom(32)
+        try:
+            self.session_duration = int(getenv('SESSION_DURATION', '0'))
+        except ValueError:
+            self.session_duration = 0
+        self.revocation = getenv('SESSION_REVOCATION', '0') == '1'
+        if self.revocation and not self.store.shared:
+            warnings.warn("SESSION_REVOCATION=1 without a shared "
+                          "SESSION_STORE: other processes won't see the "
+                          "revocations of this one", RuntimeWarning)
+
+    def open_store(self) -> SessionStore:
+        """ returns the store of the revocations """
+        return session_store(self.revocations, self.revocations_by_user_id)
+
+    def sign(self, payload: str) -> str:
+        """ Signature of a token payload """
+        return b64encode(hmac.new(self.secret, payload.encode(),
+                                  hashlib.sha256).digest())
+
+    def create_session(self, user_id: str = None) -> str:
+        """ creates a signed token for a user_id """
+        if user_id is None or not isinstance(user_id, str):
+            return None
+
+        issued_at = int(time.time())
+        expires_at = 0
+        if self.session_duration > 0:
+            expires_at = issued_at + self.session_duration
+        payload = b64encode(json.dumps(
+            [user_id, issued_at, expires_at],
+            separators=(',', ':')).encode())
+        return "{}.{}".format(payload, self.sign(payload))
+
+    def user_id_for_session_id(self, session_id: str = None) -> str:
+        """ returns the User ID of a token with a valid signature,
+        unless it has expired or been revoked """
+        if session_id is None or not isinstance(session_id, str):
+            return None
+
+        if self.revocation:
+            self.purge_revocations()
+        payload, _, signature = session_id.partition('.')
+        if not hmac.compare_digest(self.sign(payload).encode(),
+                                   signature.encode()):
+            return None
+        try:
+            user_id, issued_at, expires_at = json.loads(b64decode(payload))
+        except (ValueError, TypeError):
+            return None
+        now = time.time()
+        if expires_at and expires_at < now:
+            return None
+        if self.session_duration > 0 and \
+                issued_at + self.session_duration < now:
+            return None
+        if self.revocation:
+            if self.store.get(signature) is not None:
+                return None
+            revoked = self.store.get('user:' + user_id)
+            if revoked is not None and \
+                    issued_at <= revoked['created_at'].timestamp():
+                return None
+        return user_id
+
+    def purge_revocations(self) -> int:
+        """ deletes revocations older than the session duration: every
+        token they revoke has expired """
+        if self.session_duration <= 0:
+            return 0
+        return self.purge_sessions(
+            datetime.now() - timedelta(seconds=self.session_duration))
+
+    def destroy_session(self, request=None) -> bool:
+        """ revokes the token of a request """
+        if request is None or not self.revocation:
+            return False
+        session_id = self.session_cookie(request)
+        user_id = self.user_id_for_session_id(session_id)
+        if user_id is None:
+            return False
+        self.store.set(session_id.partition('.')[2], {
+            'user_id': user_id,
+            'created_at': datetime.now(),
+        })
+        return True
+
+    def user_session_ids(self, user_id: str = None) -> list:
+        """ tokens aren't stored: returns an empty list """
+        return []
+
+    def destroy_user_sessions(self, user_id: str = None) -> int:
+        """ revokes every token issued so far to a user """
+        if user_id is None or not isinstance(user_id, str) or \
+           not self.revocation:
+            return 0
+        self.store.set('user:' + user_id, {
+            'user_id': user_id,
+            'created_at': datetime.now(),
+        })
+        return 1
@@ -2,6 +2,7 @@
 """ Module of Index views
 """
 from flask import jsonify, abort
+from os import getenv
 from api.v1.views import app_views
 
 
@@ -23,6 +24,9 @@ def stats() -> str:
     from models.user import User
     stats = {}
     stats['users'] = User.count()
+    if getenv('AUTH_TYPE') == "session_exp_auth":
+        from api.v1.auth.session_exp_auth import SessionExpAuth
+        stats['sessions'] = SessionExpAuth.stats()
     return jsonify(stats)
 
 
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+""" Memory footprint of the in-process User store
+
+Usage: python3 bench_models.py [count ...]
+"""
+import sys
+import tracemalloc
+from models.base import DATA
+from models.user import User
+
+
+def bytes_per_user(count: int) -> float:
+    """ Traced bytes held by DATA per stored User
+    """
+    DATA['User'] = {}
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        user = User(email="user{}@holberton.io".format(i),
+                    first_name="First{}".format(i),
+                    last_name="Last{}".format(i))
+        user.password = "pwd{}".format(i)
+        DATA['User'][user.id] = user
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    DATA['User'] = {}
+    return used / count
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [100000, 1000000]
+    for count in counts:
+        print("{} users: {:.0f} bytes/user".format(count,
+                                                   bytes_per_user(count)))
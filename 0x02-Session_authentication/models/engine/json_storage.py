@@ -0,0 +1,602 @@
+#!/usr/bin/env python3
+""" JsonStorage module: objects in memory, persisted in .db_<Class>.json
+"""
+from typing import TypeVar, List
+from os import getenv, path
+from models.engine import binfile
+from models.engine.filelock import FileLock
+from models.engine.rwlock import RWLock
+from models.engine.storage import Storage
+from models.flusher import Flusher
+from models.loader import TIMESTAMPS, load_rows
+import atexit
+import bisect
+import gc
+import json
+import os
+import threading
+import time
+
+
+DATA = {}
+
+# Snapshot format: "json" (.db_<Class>.json) or "binary" (.db_<Class>.bin,
+# see models/engine/binfile.py). A snapshot found in the other format is
+# converted on load, and kept with a .bak suffix
+FORMAT = getenv("DB_FORMAT", "json")
+
+# Journaled storage: save()/remove() append one record to .db_<Class>.log
+# instead of rewriting the whole .db_<Class>.json snapshot
+JOURNAL = getenv("DB_JOURNAL", "0") == "1"
+JOURNAL_MIN_COMPACT = int(getenv("DB_JOURNAL_MIN_COMPACT", "1000"))
+JOURNALS = {}
+
+# Write-behind: changes mark the class dirty and a background Flusher
+# writes them once per DB_FLUSH_INTERVAL seconds or DB_FLUSH_BATCH changes.
+# DB_SYNC sets durability: "write" (synchronous write and fsync on every
+# change), "batch" (fsync on every flush), "interval" (timer flushes only,
+# no fsync); unset keeps the OS buffering without fsync
+WRITE_BEHIND = getenv("DB_WRITE_BEHIND", "0") == "1"
+FLUSH_INTERVAL = float(getenv("DB_FLUSH_INTERVAL", "1"))
+FLUSH_BATCH = int(getenv("DB_FLUSH_BATCH", "100"))
+SYNC_POLICY = getenv("DB_SYNC", "")
+FLUSHER = None
+PENDING = {}
+# Journal records taken from PENDING by a flush and not written yet
+INFLIGHT = {}
+
+# Bulk load: snapshots of at least DB_LOAD_PARALLEL_MIN bytes are decoded
+# by DB_LOAD_WORKERS processes when load() runs in a process that has no
+# other thread yet (the startup load); reloads catching up with other
+# processes decode serially. LOAD_STATS keeps the last load throughput
+LOAD_WORKERS = int(getenv("DB_LOAD_WORKERS", str(os.cpu_count() or 1)))
+LOAD_PARALLEL_MIN = int(getenv("DB_LOAD_PARALLEL_MIN", str(64 * 2 ** 20)))
+LOAD_STATS = {}
+
+# Secondary indexes: INDEXES[class][attribute][value] = {id: object}
+INDEXES = {}
+
+# IDs of each class in sorted order, for page(); built on first use
+# and then kept up to date by put() and pop()
+ORDER = {}
+
+# Per class locks: LOCKS guard DATA and INDEXES (readers never wait for
+# each other), FILE_LOCKS serialize the writes of the snapshot and journal
+# across threads and processes
+LOCKS = {}
+FILE_LOCKS = {}
+
+# What each class has read from its files: the snapshot stamp, and the
+# inode of the journal with the offset up to which it has been applied.
+# refresh() uses it to pick up the records other processes appended
+SEEN = {}
+
+
+def flusher() -> Flusher:
+    """ Background Flusher, started on first use
+    """
+    global FLUSHER
+    if FLUSHER is None:
+        batch = 0 if SYNC_POLICY == "interval" else FLUSH_BATCH
+        FLUSHER = Flusher(FLUSH_INTERVAL, batch)
+        FLUSHER.start()
+        atexit.register(FLUSHER.flush)
+    return FLUSHER
+
+
+def write_behind() -> bool:
+    """ True if changes are left to the background Flusher
+    """
+    return WRITE_BEHIND and SYNC_POLICY != "write"
+
+
+def stamp(file_path: str) -> tuple:
+    """ Identity of a file version: inode, mtime and size
+    """
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def sync(f):
+    """ Push a file to disk if the durability policy asks for it
+    """
+    f.flush()
+    if SYNC_POLICY in ("write", "batch"):
+        os.fsync(f.fileno())
+
+
+class JsonStorage(Storage):
+    """ Every object held in DATA, with secondary hash indexes,
+    persisted as a JSON snapshot plus an optional journal
+    """
+
+    def lock(self, cls: type) -> RWLock:
+        """ Lock guarding the objects of a class
+        """
+        return LOCKS.setdefault(cls.__name__, RWLock())
+
+    def file_lock(self, cls: type) -> FileLock:
+        """ Lock serializing the file writes of a class
+        """
+        if cls.__name__ not in FILE_LOCKS:
+            lock_path = ".db_{}.lock".format(cls.__name__)
+            FILE_LOCKS.setdefault(cls.__name__, FileLock(lock_path))
+        return FILE_LOCKS[cls.__name__]
+
+    def objects(self, cls: type) -> dict:
+        """ Objects of a class by ID
+        """
+        return DATA.setdefault(cls.__name__, {})
+
+    def file_path(self, cls: type, binary: bool = None) -> str:
+        """ Path of the snapshot file, in the configured format by default
+        """
+        if binary is None:
+            binary = FORMAT == "binary"
+        return ".db_{}.{}".format(cls.__name__, "bin" if binary else "json")
+
+    def journal_path(self, cls: type) -> str:
+        """ Path of the journal file
+        """
+        return ".db_{}.log".format(cls.__name__)
+
+    def is_stored(self, obj: TypeVar('Base')) -> bool:
+        """ True if this instance is the one held in DATA
+        """
+        s_class = obj.__class__.__name__
+        return DATA.get(s_class, {}).get(getattr(obj, 'id', None)) is obj
+
+    def index_of(self, cls: type, name: str) -> dict:
+        """ Index of an attribute: value -> {id: object}
+        """
+        s_class = cls.__name__
+        if s_class not in INDEXES:
+            INDEXES[s_class] = {attr: {} for attr in cls._indexes}
+        return INDEXES[s_class][name]
+
+    def check_unique(self, cls: type, obj_id: str, name: str, value):
+        """ Raise ValueError if another object owns a unique value
+        """
+        if not cls._indexes.get(name):
+            return
+        try:
+            bucket = self.index_of(cls, name).get(value, {})
+        except TypeError:
+            return
+        for other_id in bucket:
+            if other_id != obj_id:
+                raise ValueError("{} {} already exists".format(name, value))
+
+    def on_assign(self, obj: TypeVar('Base'), name: str, value):
+        """ Move a stored object to a new value in an index
+        """
+        if not self.is_stored(obj):
+            return
+        cls = obj.__class__
+        with self.lock(cls).write():
+            if not self.is_stored(obj):
+                return
+            self.check_unique(cls, obj.id, name, value)
+            index = self.index_of(cls, name)
+            try:
+                bucket = index.get(getattr(obj, name, None))
+                if bucket is not None:
+                    bucket.pop(obj.id, None)
+                    if not bucket:
+                        del index[getattr(obj, name, None)]
+            except TypeError:
+                pass
+            try:
+                index.setdefault(value, {})[obj.id] = obj
+            except TypeError:
+                pass
+
+    def put(self, obj: TypeVar('Base')):
+        """ Store an object in DATA and in every index
+        """
+        cls = obj.__class__
+        for name in cls._indexes:
+            self.check_unique(cls, obj.id, name, getattr(obj, name, None))
+        if self.unindex(cls, obj.id) is None:
+            order = ORDER.get(cls.__name__)
+            if order is not None:
+                bisect.insort(order, obj.id)
+        self.objects(cls)[obj.id] = obj
+        for name in cls._indexes:
+            try:
+                value = getattr(obj, name, None)
+                self.index_of(cls, name).setdefault(value, {})[obj.id] = obj
+            except TypeError:
+                pass
+
+    def pop(self, cls: type, obj_id: str) -> TypeVar('Base'):
+        """ Drop an object from DATA, from every index and from the
+        sorted IDs
+        """
+        obj = self.unindex(cls, obj_id)
+        order = ORDER.get(cls.__name__)
+        if obj is not None and order is not None:
+            i = bisect.bisect_left(order, obj_id)
+            if i < len(order) and order[i] == obj_id:
+                del order[i]
+        return obj
+
+    def unindex(self, cls: type, obj_id: str) -> TypeVar('Base'):
+        """ Drop an object from DATA and from every index, but not from
+        the sorted IDs: put() replaces it under the same ID
+        """
+        obj = self.objects(cls).pop(obj_id, None)
+        if obj is None:
+            return None
+        for name in cls._indexes:
+            index = self.index_of(cls, name)
+            try:
+                value = getattr(obj, name, None)
+                bucket = index.get(value)
+                if bucket is not None:
+                    bucket.pop(obj_id, None)
+                    if not bucket:
+                        del index[value]
+            except TypeError:
+                pass
+        return obj
+
+    def load(self, cls: type):
+        """ Load all objects from file: snapshot then journal
+
+        The snapshot is decoded in parallel only if this is the only
+        thread: forking a process with other threads running may leave
+        the children waiting on a lock held by one of them
+        """
+        self.flush_journal(cls)
+        parallel = threading.active_count() == 1
+        with self.file_lock(cls):
+            with self.lock(cls).write():
+                converted = self.load_locked(cls, parallel)
+            if converted:
+                self.dump(cls)
+                os.replace(converted, converted + ".bak")
+
+    def read_snapshot(self, cls: type, file_path: str,
+                      parallel: bool = False) -> list:
+        """ Rows of a snapshot, JSON or binary whatever its extension,
+        decoded by LOAD_WORKERS processes if parallel
+        """
+        if not binfile.is_binfile(file_path):
+            return load_rows(file_path, cls.fields(),
+                             LOAD_WORKERS if parallel else 0,
+                             LOAD_PARALLEL_MIN)
+        with binfile.BinFile(file_path) as snapshot:
+            rows = snapshot.rows()
+            if list(snapshot.fields) == list(cls.fields()):
+                return rows
+            now = int(time.time())
+            remapped = []
+            for row in rows:
+                values = dict(zip(snapshot.fields, row))
+                remapped.append([values.get(
+                    name, now if name in TIMESTAMPS else None)
+                    for name in cls.fields()] + [row[-1]])
+            return remapped
+
+    def load_locked(self, cls: type, parallel: bool = False) -> str:
+        """ Load all objects from file, holding the locks of the class,
+        and return the path of the snapshot if it was not in the
+        configured format. Big snapshots are decoded by several
+        processes if parallel
+
+        The garbage collector is paused while the objects are built,
+        it would otherwise rescan them many times over
+        """
+        s_class = cls.__name__
+        file_path = self.file_path(cls)
+        converted = None
+        if not path.exists(file_path):
+            other_path = self.file_path(cls, FORMAT != "binary")
+            if path.exists(other_path):
+                converted = file_path = other_path
+        DATA[s_class] = {}
+        INDEXES.pop(s_class, None)
+        ORDER.pop(s_class, None)
+        JOURNALS[s_class] = 0
+        SEEN[s_class] = {'snapshot': stamp(file_path),
+                         'journal': None, 'offset': 0}
+        start = time.perf_counter()
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            if path.exists(file_path):
+                rows = self.read_snapshot(cls, file_path, parallel)
+                objs = DATA[s_class]
+                for row in rows:
+                    obj = cls.from_row(row)
+                    objs[obj.id] = obj
+                self.rebuild_indexes(cls)
+            self.replay_journal(cls, truncate=True)
+            self.reapply_local(cls)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        seconds = time.perf_counter() - start
+        LOAD_STATS[s_class] = {
+            'records': len(DATA[s_class]),
+            'seconds': seconds,
+            'records_per_sec': len(DATA[s_class]) / seconds,
+        }
+        return converted
+
+    def rebuild_indexes(self, cls: type):
+        """ Build every index of the class from DATA in one pass
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = {name: {} for name in cls._indexes}
+        for name, index in INDEXES[s_class].items():
+            for obj_id, obj in DATA[s_class].items():
+                try:
+                    value = getattr(obj, name, None)
+                    index.setdefault(value, {})[obj_id] = obj
+                except TypeError:
+                    pass
+
+    def replay_journal(self, cls: type, truncate: bool = False) -> int:
+        """ Apply the complete journal records not applied yet on DATA,
+        and return how many were applied
+
+        With truncate, a torn record left by a crash in the middle of
+        an append is cut off so the next appends start on a clean line
+        """
+        journal_path = self.journal_path(cls)
+        s_class = cls.__name__
+        seen = SEEN[s_class]
+        count = 0
+        try:
+            f = open(journal_path, 'rb')
+        except FileNotFoundError:
+            return count
+        with f:
+            seen['journal'] = os.fstat(f.fileno()).st_ino
+            f.seek(seen['offset'])
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self.apply_record(cls, record)
+                JOURNALS[s_class] += 1
+                seen['offset'] += len(line)
+                count += 1
+            if truncate and seen['offset'] < os.fstat(f.fileno()).st_size:
+                os.truncate(journal_path, seen['offset'])
+        return count
+
+    def reapply_local(self, cls: type):
+        """ Apply again on DATA the changes of this process that are not
+        in the journal yet, so what other processes wrote doesn't
+        overwrite them (write lock held)
+        """
+        s_class = cls.__name__
+        for line in INFLIGHT.get(s_class, []) + PENDING.get(s_class, []):
+            self.apply_record(cls, json.loads(line))
+
+    def changed(self, cls: type) -> bool:
+        """ True if another process wrote the files of a class since
+        they were last read
+        """
+        seen = SEEN.get(cls.__name__)
+        if seen is None:
+            return False
+        if stamp(self.file_path(cls)) != seen['snapshot']:
+            return True
+        journal = stamp(self.journal_path(cls))
+        if journal is None:
+            return False
+        return journal[0] != seen['journal'] or journal[2] != seen['offset']
+
+    def catch_up(self, cls: type) -> bool:
+        """ Apply what other processes wrote, holding the file lock
+
+        New journal records are applied incrementally; a new snapshot
+        (written by a compaction) means a full reload. Either way, the
+        changes of this process not written yet are applied again on top
+        """
+        if not self.changed(cls):
+            return False
+        seen = SEEN[cls.__name__]
+        journal = stamp(self.journal_path(cls))
+        with self.lock(cls).write():
+            if stamp(self.file_path(cls)) != seen['snapshot'] or \
+                    (seen['journal'] is not None and
+                     journal[0] != seen['journal']) or \
+                    journal[2] < seen['offset']:
+                self.load_locked(cls)
+            else:
+                self.replay_journal(cls)
+                self.reapply_local(cls)
+        return True
+
+    def refresh(self, cls: type):
+        """ Pick up the changes other processes made to a class
+
+        Costs two stat() calls when nothing changed
+        """
+        if self.changed(cls):
+            with self.file_lock(cls):
+                self.catch_up(cls)
+
+    def apply_record(self, cls: type, record: dict):
+        """ Apply one journal record on DATA
+        """
+        if record.get('op') == 'save':
+            self.put(cls(**record['data']))
+        elif record.get('op') == 'remove':
+            self.pop(cls, record['id'])
+
+    def append_record(self, cls: type, record: dict):
+        """ Queue one compact record for the journal
+
+        Called with the write lock held, so records are queued in the
+        order their changes were applied to DATA
+        """
+        if JOURNAL:
+            line = json.dumps(record, separators=(',', ':')) + '\n'
+            PENDING.setdefault(cls.__name__, []).append(line)
+
+    def flush_journal(self, cls: type):
+        """ Write all pending journal records at once
+
+        The journal is folded into the snapshot once it holds more
+        records than objects, so a write stays O(1) amortized
+        """
+        s_class = cls.__name__
+        with self.file_lock(cls):
+            with self.lock(cls).write():
+                lines, PENDING[s_class] = PENDING.get(s_class, []), []
+                INFLIGHT[s_class] = lines
+            if not lines:
+                return
+            try:
+                self.catch_up(cls)
+                with open(self.journal_path(cls), 'a') as f:
+                    f.write(''.join(lines))
+                    sync(f)
+                    if s_class in SEEN:
+                        SEEN[s_class]['journal'] = os.fstat(f.fileno()).st_ino
+                        SEEN[s_class]['offset'] = f.tell()
+            except Exception:
+                with self.lock(cls).write():
+                    PENDING[s_class] = lines + PENDING.get(s_class, [])
+                raise
+            finally:
+                with self.lock(cls).write():
+                    INFLIGHT[s_class] = []
+            JOURNALS[s_class] = JOURNALS.get(s_class, 0) + len(lines)
+            if JOURNALS[s_class] > max(JOURNAL_MIN_COMPACT,
+                                       len(DATA[s_class])):
+                self.dump(cls)
+
+    def persist(self, cls: type):
+        """ Make the changes durable according to the storage settings
+        """
+        if JOURNAL:
+            flush = self.flush_journal
+        else:
+            flush = self.dump
+        if write_behind():
+            flusher().mark(cls.__name__, lambda: flush(cls))
+        else:
+            flush(cls)
+
+    def dump(self, cls: type):
+        """ Save all objects to file
+
+        The snapshot holds one object per line, so big files can be
+        decoded in parallel. It is written to a temporary file then
+        renamed over the previous one, and only then the journal
+        is dropped. The objects are only locked while being listed,
+        never during the serialization
+        """
+        s_class = cls.__name__
+        file_path = self.file_path(cls)
+        tmp_path = "{}.tmp".format(file_path)
+        with self.file_lock(cls):
+            if JOURNAL:
+                self.catch_up(cls)
+            with self.lock(cls).read():
+                objs = list(self.objects(cls).items())
+            if FORMAT == "binary":
+                binfile.write(tmp_path, cls.fields(),
+                              (obj.to_row() for obj_id, obj in objs))
+                with open(tmp_path, 'rb') as f:
+                    sync(f)
+            else:
+                with open(tmp_path, 'w') as f:
+                    f.write('{')
+                    separator = '\n'
+                    for obj_id, obj in objs:
+                        f.write('{}{}: {}'.format(
+                            separator, json.dumps(obj_id),
+                            json.dumps(obj.to_json(True))))
+                        separator = ',\n'
+                    f.write('\n}')
+                    sync(f)
+            os.replace(tmp_path, file_path)
+            if path.exists(self.journal_path(cls)):
+                os.remove(self.journal_path(cls))
+            JOURNALS[s_class] = 0
+            SEEN[s_class] = {'snapshot': stamp(file_path),
+                             'journal': None, 'offset': 0}
+
+    def save(self, obj: TypeVar('Base')):
+        """ Store an object and persist the change
+        """
+        cls = obj.__class__
+        with self.lock(cls).write():
+            self.put(obj)
+            self.append_record(cls, {'op': 'save', 'data': obj.to_json(True)})
+        self.persist(cls)
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Remove an object and persist the change
+        """
+        cls = obj.__class__
+        with self.lock(cls).write():
+            if self.pop(cls, obj.id) is None:
+                return
+            self.append_record(cls, {'op': 'remove', 'id': obj.id})
+        self.persist(cls)
+
+    def count(self, cls: type) -> int:
+        """ Count all objects (a single dict access needs no lock)
+        """
+        return len(self.objects(cls))
+
+    def get(self, cls: type, id: str) -> TypeVar('Base'):
+        """ Return one object by ID (a single dict access needs no lock)
+        """
+        return self.objects(cls).get(id)
+
+    def search(self, cls: type,
+               attributes: dict = {}) -> List[TypeVar('Base')]:
+        """ Search all objects with matching attributes
+
+        The candidates come from the first indexed attribute of the
+        query, if any, instead of every object of the class
+        """
+        def _search(obj):
+            if len(attributes) == 0:
+                return True
+            for k, v in attributes.items():
+                if (getattr(obj, k) != v):
+                    return False
+            return True
+
+        with self.lock(cls).read():
+            objs = self.objects(cls)
+            for k, v in attributes.items():
+                if k not in cls._indexes:
+                    continue
+                try:
+                    objs = self.index_of(cls, k).get(v, {})
+                    break
+                except TypeError:
+                    continue
+            return list(filter(_search, objs.values()))
+
+    def page(self, cls: type, after: str = None,
+             limit: int = 100) -> List[TypeVar('Base')]:
+        """ Return at most limit objects with an ID greater than after,
+        located by bisection in the sorted IDs
+        """
+        with self.lock(cls).read():
+            s_class = cls.__name__
+            order = ORDER.get(s_class)
+            if order is None:
+                order = ORDER[s_class] = sorted(self.objects(cls))
+            start = 0 if after is None else bisect.bisect_right(order, after)
+            objs = self.objects(cls)
+            return [objs[obj_id] for obj_id in order[start:start + limit]]
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+""" SQLiteStorage module: objects kept on disk in a SQLite database
+"""
+from datetime import datetime
+from typing import TypeVar, List
+from models.engine.storage import Storage
+from models.loader import decode
+import json
+import sqlite3
+import threading
+
+
+class SQLiteStorage(Storage):
+    """ One table per class, holding each object as a JSON document
+
+    The database runs in WAL mode so readers never wait for the
+    writer, and every indexed attribute of a class gets an
+    expression index used by search()
+    """
+
+    def __init__(self, db_path: str = ".db.sqlite3"):
+        """ Initialize a SQLiteStorage
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        self._tables = set()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """ Connection of the current thread
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def table(self, cls: type) -> str:
+        """ Quoted table name of a class, created on first use
+        """
+        name = '"{}"'.format(cls.__name__)
+        if cls.__name__ not in self._tables:
+            conn = self.connection
+            conn.execute("CREATE TABLE IF NOT EXISTS {} "
+                         "(id TEXT PRIMARY KEY, data TEXT NOT NULL)"
+                         .format(name))
+            for attr, unique in cls._indexes.items():
+                conn.execute("CREATE {}INDEX IF NOT EXISTS \"{}_{}\" "
+                             "ON {} (json_extract(data, '$.{}'))"
+                             .format("UNIQUE " if unique else "",
+                                     cls.__name__, attr, name, attr))
+            self._tables.add(cls.__name__)
+        return name
+
+    def to_object(self, cls: type, data: str) -> TypeVar('Base'):
+        """ Build an object from its stored JSON document
+        """
+        return cls.from_row(decode([json.loads(data)], cls.fields())[0])
+
+    def load(self, cls: type):
+        """ Create the table and indexes of a class
+        """
+        self.table(cls)
+
+    def get(self, cls: type, id: str) -> TypeVar('Base'):
+        """ Return one object by ID
+        """
+        row = self.connection.execute(
+            "SELECT data FROM {} WHERE id = ?".format(self.table(cls)),
+            (id,)).fetchone()
+        return None if row is None else self.to_object(cls, row[0])
+
+    def search(self, cls: type,
+               attributes: dict = {}) -> List[TypeVar('Base')]:
+        """ Search all objects with matching attributes
+        """
+        clauses = []
+        params = []
+        for k, v in attributes.items():
+            if isinstance(v, datetime):
+                v = v.strftime("%Y-%m-%dT%H:%M:%S")
+            if v is None:
+                clauses.append("json_extract(data, '$.{}') IS NULL"
+                               .format(k))
+            else:
+                clauses.append("json_extract(data, '$.{}') = ?".format(k))
+                params.append(v)
+        query = "SELECT data FROM {}".format(self.table(cls))
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        rows = self.connection.execute(query + " ORDER BY rowid", params)
+        return [self.to_object(cls, data) for data, in rows]
+
+    def save(self, obj: TypeVar('Base')):
+        """ Insert or update an object
+        """
+        try:
+            self.connection.execute(
+                "INSERT INTO {} (id, data) VALUES (?, ?) ON CONFLICT(id) "
+                "DO UPDATE SET data = excluded.data"
+                .format(self.table(obj.__class__)),
+                (obj.id, json.dumps(obj.to_json(True))))
+        except sqlite3.IntegrityError as e:
+            raise ValueError(str(e))
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete an object
+        """
+        self.connection.execute(
+            "DELETE FROM {} WHERE id = ?".format(self.table(obj.__class__)),
+            (obj.id,))
+
+    def count(self, cls: type) -> int:
+        """ Count all objects
+        """
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM {}".format(self.table(cls))).fetchone()[0]
+
+    def page(self, cls: type, after: str = None,
+             limit: int = 100) -> List[TypeVar('Base')]:
+        """ Return at most limit objects with an ID greater than after,
+        walking the primary key index
+        """
+        rows = self.connection.execute(
+            "SELECT data FROM {} WHERE id > ? ORDER BY id LIMIT ?"
+            .format(self.table(cls)), (after or "", limit))
+        return [self.to_object(cls, data) for data, in rows]
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+""" Storage module: interface of the storage engines behind Base
+"""
+from typing import TypeVar, List, Iterable
+
+
+class Storage():
+    """ Storage engine interface
+
+    Every method receives the model class (or object) it works on,
+    so one engine serves all the models
+    """
+
+    def load(self, cls: type):
+        """ Prepare the storage of a class
+        """
+        pass
+
+    def dump(self, cls: type):
+        """ Write every object of a class to its durable storage
+        """
+        pass
+
+    def refresh(self, cls: type):
+        """ Pick up the changes other processes made to a class
+        """
+        pass
+
+    def on_assign(self, obj: TypeVar('Base'), name: str, value):
+        """ Called before an indexed attribute of obj is assigned
+        """
+        pass
+
+    def get(self, cls: type, id: str) -> TypeVar('Base'):
+        """ Return one object by ID
+        """
+        raise NotImplementedError()
+
+    def search(self, cls: type,
+               attributes: dict = {}) -> List[TypeVar('Base')]:
+        """ Search all objects with matching attributes
+        """
+        raise NotImplementedError()
+
+    def save(self, obj: TypeVar('Base')):
+        """ Store an object, inserted or updated
+        """
+        raise NotImplementedError()
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Remove an object
+        """
+        raise NotImplementedError()
+
+    def count(self, cls: type) -> int:
+        """ Count all objects
+        """
+        raise NotImplementedError()
+
+    def all(self, cls: type) -> Iterable[TypeVar('Base')]:
+        """ Return all objects
+        """
+        return self.search(cls)
+
+    def page(self, cls: type, after: str = None,
+             limit: int = 100) -> List[TypeVar('Base')]:
+        """ Return at most limit objects with an ID greater than after,
+        ordered by ID
+        """
+        objs = sorted(self.all(cls), key=lambda obj: obj.id)
+        return [obj for obj in objs
+                if after is None or obj.id > after][:limit]
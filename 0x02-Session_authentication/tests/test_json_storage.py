@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+""" Tests of the json storage engine shared by several processes
+
+Usage: python3 -m unittest discover tests
+"""
+from unittest import mock
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from models import base
+from models.engine import json_storage
+from models.engine.json_storage import JsonStorage
+from models.user import User
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+from models.engine import json_storage
+from models.user import User
+User.load_from_file()
+user = User(email="a@holberton.io")
+user.save()
+print(user.id, flush=True)
+input()
+User.refresh()
+print(User.get(user.id) is not None, User.count(), flush=True)
+json_storage.FLUSHER.flush()
+User.refresh()
+print(User.get(user.id) is not None, User.count(), flush=True)
+"""
+
+COMPACTOR = """
+from models.user import User
+User.load_from_file()
+User(email="b@holberton.io").save()
+User.save_to_file()
+"""
+
+COUNTER = """
+from models.user import User
+User.load_from_file()
+print(User.count())
+"""
+
+
+class TestJournalSharedByProcesses(unittest.TestCase):
+    """ DB_JOURNAL=1 and DB_WRITE_BEHIND=1 workers sharing the same files
+    """
+
+    def setUp(self):
+        """ Run the workers in an empty directory
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = dict(os.environ, PYTHONPATH=ROOT, DB_ENGINE="json",
+                        DB_JOURNAL="1", DB_WRITE_BEHIND="1",
+                        DB_FLUSH_INTERVAL="3600", DB_SYNC="")
+
+    def tearDown(self):
+        """ Drop the files of the workers
+        """
+        self.tmp.cleanup()
+
+    def run_code(self, code: str) -> str:
+        """ Run code in a new worker process, return its output
+        """
+        return subprocess.run(
+            [sys.executable, "-c", code], cwd=self.tmp.name, env=self.env,
+            check=True, stdout=subprocess.PIPE,
+            universal_newlines=True).stdout
+
+    def test_pending_changes_survive_a_reload(self):
+        """ A worker reloading after a compaction by another worker keeps
+        the changes it has not written yet
+        """
+        worker = subprocess.Popen(
+            [sys.executable, "-c", WORKER], cwd=self.tmp.name, env=self.env,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            universal_newlines=True)
+        try:
+            worker.stdout.readline()
+            self.run_code(COMPACTOR)
+            out, _ = worker.communicate("\n", timeout=60)
+        finally:
+            if worker.poll() is None:
+                worker.kill()
+        self.assertEqual(out.split("\n")[:2], ["True 2", "True 2"])
+        self.assertEqual(self.run_code(COUNTER).strip(), "2")
+
+
+class TestPage(unittest.TestCase):
+    """ Pages of users in ID order, as users are created, updated and
+    deleted
+    """
+
+    def setUp(self):
+        """ Empty json storage in an empty directory
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        for registry in (json_storage.DATA, json_storage.INDEXES,
+                         json_storage.ORDER, json_storage.PENDING):
+            patcher = mock.patch.dict(registry)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+            registry.pop('User', None)
+        patcher = mock.patch.object(base, 'STORAGE', JsonStorage())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.users = []
+        for i in range(10):
+            user = User(id="id{:02d}".format(i),
+                        email="{}@holberton.io".format(i))
+            user.save()
+            self.users.append(user)
+
+    def tearDown(self):
+        """ Drop the files
+        """
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def all_pages(self, limit: int = 3) -> list:
+        """ IDs of every page, following the cursor
+        """
+        ids = []
+        page = User.page(None, limit)
+        while page:
+            ids.extend(user.id for user in page)
+            page = User.page(ids[-1], limit)
+        return ids
+
+    def ids(self) -> list:
+        """ IDs of the users expected
+        """
+        return sorted(user.id for user in self.users)
+
+    def test_pages(self):
+        """ Every user once, in ID order
+        """
+        self.assertEqual(self.all_pages(), self.ids())
+        self.assertEqual([u.id for u in User.page("id04", 2)],
+                         ["id05", "id06"])
+
+    def test_update(self):
+        """ An updated user keeps its place
+        """
+        self.all_pages()
+        self.users[3].first_name = "Bob"
+        self.users[3].save()
+        self.assertEqual(self.all_pages(), self.ids())
+        self.assertEqual(User.page("id02", 1)[0].first_name, "Bob")
+
+    def test_replayed_update(self):
+        """ A journal record saving a known user keeps its place
+        """
+        self.all_pages()
+        data = self.users[5].to_json(True)
+        data['last_name'] = "Replayed"
+        base.storage().apply_record(User, {'op': 'save', 'data': data})
+        self.assertEqual(self.all_pages(), self.ids())
+
+    def test_delete(self):
+        """ A deleted user leaves the pages, the others stay, even after
+        updates and when it sorted last
+        """
+        self.all_pages()
+        for user in (self.users[4], self.users[9]):
+            user.save()
+            user.remove()
+            self.users.remove(user)
+            self.assertEqual(self.all_pages(), self.ids())
+        self.assertIsNone(User.get("id09"))
+        self.assertEqual(User.search({'email': "9@holberton.io"}), [])
+
+    def test_create(self):
+        """ A new user takes its place
+        """
+        self.all_pages()
+        user = User(id="id045", email="new@holberton.io")
+        user.save()
+        self.users.append(user)
+        self.assertEqual(self.all_pages(), self.ids())
+
+
+if __name__ == "__main__":
+    unittest.main()
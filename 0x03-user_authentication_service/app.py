@@ -1,10 +1,25 @@
 #!/usr/bin/env python3
 """ Basic Flask app module """
 from flask import Flask, jsonify, redirect, request, abort, url_for
-from auth import Auth
+from auth import Auth, HashPoolBusy
 
 app = Flask(__name__)
 AUTH = Auth()
+AUTH.start_sweeper()
+
+
+@app.errorhandler(HashPoolBusy)
+def hash_pool_busy(error) -> str:
+    """ Too many logins or registrations are being hashed: retry later """
+    response = jsonify({"message": "service busy"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
+@app.teardown_appcontext
+def release_db(exception) -> None:
+    """ Releases the database session of the request """
+    AUTH.release_db()
 
 
 @app.route("/")
@@ -12,6 +27,12 @@ def index() -> str:
     return jsonify({"message": "Bienvenue"})
 
 
+@app.route("/stats")
+def stats() -> str:
+    """ Stats of the user cache and of the expired rows sweeper """
+    return jsonify(AUTH.stats())
+
+
 @app.route("/users", methods=["POST"])
 def register_user() -> str:
     """ Function that implements the POST /users route. """
@@ -48,7 +69,7 @@ def logout() -> str:
     user = AUTH.get_user_from_session_id(session_id)
 
     if user:
-        AUTH.destroy_session(user.id)
+        AUTH.destroy_session(user.id, session_id)
         return redirect('/')
     abort(403)
 
@@ -1,14 +1,119 @@
 #!/usr/bin/env python3
 """ auth module """
 import bcrypt
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
 from db import DB
 
+from os import getenv
 from sqlalchemy.orm.exc import NoResultFound
-from typing import Union
+from typing import Iterable, List, Union
+from sweeper import Sweeper
 from user import User
+import multiprocessing
+import os
+import threading
 import uuid
 
 
+HASH_WORKERS = int(getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_QUEUE = int(getenv("HASH_QUEUE", str(4 * max(HASH_WORKERS, 1))))
+SESSION_DURATION = int(getenv("SESSION_DURATION", "0"))
+RESET_TOKEN_DURATION = int(getenv("RESET_TOKEN_DURATION", "3600"))
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+_hash_slots = threading.BoundedSemaphore(max(HASH_QUEUE, 1))
+
+
+class HashPoolBusy(Exception):
+    """Raised when HASH_QUEUE bcrypt computations are already pending."""
+
+
+def _hashpw(password: bytes) -> bytes:
+    """Hashes a password with a new salt, in a worker process."""
+    return bcrypt.hashpw(password, bcrypt.gensalt())
+
+
+def _checkpw(password: bytes, hashed_password: bytes) -> bool:
+    """Checks a password against its hash, in a worker process."""
+    return bcrypt.checkpw(password, hashed_password)
+
+
+def _run_bcrypt(fn, *args):
+    """Runs a bcrypt computation in the pool of HASH_WORKERS processes,
+    or inline if HASH_WORKERS is 0.
+
+       Args:
+          fn: _hashpw or _checkpw.
+          *args: Its arguments.
+
+      Returns:
+            The result of fn.
+
+      Raises:
+            HashPoolBusy: If HASH_QUEUE computations are already pending.
+    """
+    if HASH_WORKERS <= 0:
+        return fn(*args)
+    if not _hash_slots.acquire(blocking=False):
+        raise HashPoolBusy()
+    try:
+        return _get_hash_pool().submit(fn, *args).result()
+    finally:
+        _hash_slots.release()
+
+
+def _get_hash_pool() -> ProcessPoolExecutor:
+    """Returns the pool of HASH_WORKERS processes, started on first use.
+
+    All its workers are forked at once, by a first task run here. Auth()
+    starts the pool, so that happens before the app starts the sweeper
+    or serves requests: forking a multithreaded process may leave the
+    children waiting on a lock another thread held at fork time. (Spawned
+    workers would import the main script again, and create another Auth.)
+    """
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            _hash_pool = ProcessPoolExecutor(
+                HASH_WORKERS, multiprocessing.get_context('fork'))
+            _hash_pool.submit(int).result()
+    return _hash_pool
+
+
+def _hash_passwords(passwords: List[str]) -> List[bytes]:
+    """Hashes many passwords, spread over the HASH_WORKERS processes.
+
+       Args:
+          passwords (list): The passwords to hash.
+
+      Returns:
+            list: The hashed passwords, in the same order.
+    """
+    encoded = [password.encode('utf-8') for password in passwords]
+    if HASH_WORKERS <= 0:
+        return [_hashpw(password) for password in encoded]
+    chunksize = max(1, len(encoded) // (4 * HASH_WORKERS))
+    return list(_get_hash_pool().map(_hashpw, encoded, chunksize=chunksize))
+
+
+def _valid_record(user: dict) -> bool:
+    """Checks a record of register_users.
+
+       Args:
+          user (dict): The record.
+
+      Returns:
+            bool: True if it has an email, and a password or a
+                hashed_password.
+    """
+    return (isinstance(user.get('email'), str) and bool(user['email'])
+            and (isinstance(user.get('password'), str)
+                 and bool(user['password'])
+                 or isinstance(user.get('hashed_password'), (str, bytes))
+                 and bool(user['hashed_password'])))
+
+
 def _hash_password(password: str) -> bytes:
     """Hashes a password using bcrypt hashpw.
 
@@ -18,9 +123,7 @@ def _hash_password(password: str) -> bytes:
       Returns:
             bytes: The hashed password.
     """
-    salt = bcrypt.gensalt()
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed_password
+    return _run_bcrypt(_hashpw, password.encode('utf-8'))
 
 
 def _generate_uuid() -> str:
@@ -34,6 +137,37 @@ class Auth:
 
     def __init__(self):
         self._db = DB()
+        self.sweeper = None
+        if HASH_WORKERS > 0:
+            _get_hash_pool()
+
+    def start_sweeper(self, interval: float = None) -> Sweeper:
+        """Starts the background removal of expired sessions and reset
+        tokens, every interval seconds (DB_SWEEP_INTERVAL by default).
+
+        Returns:
+            Sweeper: The sweeper thread, or None if interval isn't
+                positive.
+        """
+        if self.sweeper is None:
+            sweeper = Sweeper(self._db) if interval is None \
+                else Sweeper(self._db, interval)
+            if sweeper.interval <= 0:
+                return None
+            self.sweeper = sweeper
+            sweeper.start()
+        return self.sweeper
+
+    def stats(self) -> dict:
+        """Returns the stats of the user cache and of the sweeper."""
+        return {
+            'cache': self._db.cache.stats(),
+            'sweeper': self.sweeper.stats() if self.sweeper else None,
+        }
+
+    def release_db(self) -> None:
+        """Releases the database session of the current thread."""
+        self._db.close()
 
     def register_user(self, email: str, password: str) -> User:
         """Registers a new user with the given email and password.
@@ -54,6 +188,65 @@ class Auth:
             return self._db.add_user(email, _hash_password(password))
         raise ValueError("User {} already exists".format(email))
 
+    def register_users(self, users: Iterable[dict],
+                       batch_size: int = 1000) -> dict:
+        """Registers many users, batch_size at a time: one query finds
+        the emails already registered, the passwords are hashed in
+        parallel, and the new users are inserted in one transaction.
+
+        Args:
+            users (iterable): Dictionaries with an email and either a
+                password or a bcrypt hashed_password. They aren't
+                modified.
+            batch_size (int): The number of users per transaction.
+
+        Returns:
+            dict: The number of users created, of users skipped because
+                their email was already registered (or repeated, or
+                registered meanwhile), and of invalid records skipped
+                because they lack an email or a password.
+        """
+        stats = {'created': 0, 'skipped': 0, 'invalid': 0}
+        batch = []
+        for user in users:
+            batch.append(user)
+            if len(batch) >= batch_size:
+                self._register_batch(batch, stats)
+                batch = []
+        if batch:
+            self._register_batch(batch, stats)
+        return stats
+
+    def _register_batch(self, users: List[dict], stats: dict) -> None:
+        """Registers one batch of users for register_users."""
+        valid = []
+        for user in users:
+            if not _valid_record(user):
+                stats['invalid'] += 1
+                continue
+            valid.append(user)
+        existing = self._db.find_emails([user['email'] for user in valid])
+        new_users = []
+        for user in valid:
+            if user['email'] in existing:
+                stats['skipped'] += 1
+                continue
+            existing.add(user['email'])
+            hashed_password = user.get('hashed_password')
+            if isinstance(hashed_password, str):
+                hashed_password = hashed_password.encode()
+            new_users.append({'email': user['email'],
+                              'password': user.get('password'),
+                              'hashed_password': hashed_password})
+        to_hash = [user for user in new_users
+                   if not user['hashed_password']]
+        hashed = _hash_passwords([user['password'] for user in to_hash])
+        for user, hashed_password in zip(to_hash, hashed):
+            user['hashed_password'] = hashed_password
+        created = self._db.add_users(new_users)
+        stats['created'] += created
+        stats['skipped'] += len(new_users) - created
+
     def valid_login(self, email: str, password: str) -> bool:
         """Check if the provided email and password combination is valid.
 
@@ -65,17 +258,22 @@ class Auth:
             bool: True if the login is valid, False otherwise.
         """
         try:
-            user = self._db.find_user_by(email=email)
+            user = self._db.find_user_by(cached=False, email=email)
             if user is not None:
-                return bcrypt.checkpw(
+                return _run_bcrypt(
+                        _checkpw,
                         password.encode('utf-8'),
                         user.hashed_password
                 )
+        except HashPoolBusy:
+            raise
         except Exception:
             return False
 
     def create_session(self, email: str) -> str:
-        """Create a session for the user with the specified email.
+        """Create a session for the user with the specified email, in
+        addition to their other sessions. It expires after
+        SESSION_DURATION seconds (never if 0).
 
         Args:
             email (str): The email of the user.
@@ -89,7 +287,7 @@ class Auth:
             return None
 
         session_id = _generate_uuid()
-        self._db.update_user(user.id, session_id=session_id)
+        self._db.add_session(user.id, session_id, SESSION_DURATION)
 
         return session_id
 
@@ -106,22 +304,22 @@ class Auth:
             return None
 
         try:
-            user = self._db.find_user_by(session_id=session_id)
-            return user
+            return self._db.find_user_by_session(session_id)
         except Exception:
             return None
 
-    def destroy_session(self, user_id: int) -> None:
-        """ Updates the corresponding user’s session ID to None """
+    def destroy_session(self, user_id: int, session_id: str = None) -> None:
+        """ Deletes one session of the user, or all of them """
         if user_id is None:
             return None
 
-        self._db.update_user(user_id, session_id=None)
+        self._db.delete_sessions(user_id, session_id)
 
     def get_reset_password_token(self, email: str) -> str:
         """
         Generates and returns a reset password token for the user
-        with the given email.
+        with the given email. It expires after RESET_TOKEN_DURATION
+        seconds (never if 0).
         """
         try:
             user = self._db.find_user_by(email=email)
@@ -129,21 +327,31 @@ class Auth:
             raise ValueError()
 
         reset_token = _generate_uuid()
-        self._db.update_user(user.id, reset_token=reset_token)
+        expires_at = None
+        if RESET_TOKEN_DURATION > 0:
+            expires_at = datetime.utcnow() + \
+                timedelta(seconds=RESET_TOKEN_DURATION)
+        self._db.update_user(user.id, reset_token=reset_token,
+                             reset_token_expires_at=expires_at)
 
         return reset_token
 
     def update_password(self, reset_token, password):
-        """Updates the user's password using the reset token."""
+        """Updates the user's password using the reset token, unless it
+        has expired."""
         try:
             user = self._db.find_user_by(reset_token=reset_token)
         except NoResultFound:
             user = None
         if user is None:
             raise ValueError()
+        if user.reset_token_expires_at is not None and \
+           user.reset_token_expires_at <= datetime.utcnow():
+            raise ValueError()
         password_hash = _hash_password(password)
         self._db.update_user(
             user.id,
             hashed_password=password_hash,
             reset_token=None,
+            reset_token_expires_at=None,
         )
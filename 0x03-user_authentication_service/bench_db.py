@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+""" Latency of DB.find_user_by and DB.find_user_by_session lookups as the
+users and sessions tables grow
+
+Usage: python3 bench_db.py [number of users ...]
+"""
+from datetime import datetime
+import os
+import random
+import sys
+import tempfile
+import timeit
+
+
+def fill(db, count: int):
+    """ Insert count users, with a reset token and a session each
+    """
+    from user import User, UserSession
+    now = datetime.utcnow()
+    users = [{'id': i + 1,
+              'email': "user{}@holberton.io".format(i),
+              'hashed_password': "hash{}".format(i),
+              'reset_token': "token{}".format(i)} for i in range(count)]
+    sessions = [{'id': "session{}".format(i), 'user_id': i + 1,
+                 'created_at': now, 'last_seen_at': now}
+                for i in range(count)]
+    with db._engine.begin() as conn:
+        conn.execute(User.__table__.insert(), users)
+        conn.execute(UserSession.__table__.insert(), sessions)
+
+
+def per_lookup(db, count: int, number: int = 1000) -> dict:
+    """ Microseconds per lookup, for each lookup column (the user cache
+    is bypassed, except for the user of a session)
+    """
+    lookups = (
+        ('email', "user{}@holberton.io",
+         lambda key: db.find_user_by(cached=False, email=key)),
+        ('reset_token', "token{}",
+         lambda key: db.find_user_by(cached=False, reset_token=key)),
+        ('session', "session{}", db.find_user_by_session),
+    )
+    latencies = {}
+    for column, fmt, lookup in lookups:
+        keys = [fmt.format(random.randrange(count)) for _ in range(number)]
+        it = iter(keys)
+        seconds = timeit.timeit(lambda: lookup(next(it)), number=number)
+        latencies[column] = seconds / number * 1e6
+    return latencies
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+    os.chdir(tempfile.mkdtemp())
+    os.environ["DB_PERSIST"] = "0"
+    from db import DB
+
+    for count in counts:
+        db = DB()
+        fill(db, count)
+        latencies = per_lookup(db, count)
+        print("{} users: {}".format(count, ", ".join(
+            "{} {:.0f} us".format(column, us)
+            for column, us in latencies.items())))
+        db._engine.dispose()
+        os.remove("a.db")
@@ -1,15 +1,151 @@
 #!/usr/bin/env python3
 """DB module
 """
-from sqlalchemy import create_engine
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from os import getenv
+from sqlalchemy import bindparam, create_engine, event, inspect, text
+from sqlalchemy import delete, insert, or_, select, update
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.orm.session import Session
 from sqlalchemy.exc import InvalidRequestError
 from sqlalchemy.orm.exc import NoResultFound
+from typing import Dict, List, Set, Union
+import threading
+import time
 
 from user import Base
 from user import User
+from user import UserSession
+
+
+DB_PATH = getenv("DB_PATH", "a.db")
+DB_PERSIST = getenv("DB_PERSIST", "0") == "1"
+DB_POOL_SIZE = int(getenv("DB_POOL_SIZE", "5"))
+DB_POOL_OVERFLOW = int(getenv("DB_POOL_OVERFLOW", "10"))
+DB_JOURNAL_MODE = getenv("DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = getenv("DB_SYNCHRONOUS", "NORMAL")
+DB_BUSY_TIMEOUT = int(getenv("DB_BUSY_TIMEOUT", "30000"))
+DB_CACHE_SIZE = int(getenv("DB_CACHE_SIZE", "10000"))
+DB_CACHE_TTL = float(getenv("DB_CACHE_TTL", "30"))
+DB_TOUCH_BATCH = int(getenv("DB_TOUCH_BATCH", "100"))
+DB_TOUCH_INTERVAL = float(getenv("DB_TOUCH_INTERVAL", "60"))
+DB_SWEEP_INTERVAL = float(getenv("DB_SWEEP_INTERVAL", "60"))
+DB_SWEEP_BATCH = int(getenv("DB_SWEEP_BATCH", "500"))
+
+# Schema changes, in order: MIGRATIONS[n] upgrades a database of version
+# n (PRAGMA user_version) to version n + 1. A database created from the
+# models is at the last version
+MIGRATIONS = [
+    [
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email)",
+        "CREATE INDEX IF NOT EXISTS ix_users_session_id "
+        "ON users (session_id)",
+        "CREATE INDEX IF NOT EXISTS ix_users_reset_token "
+        "ON users (reset_token)",
+    ],
+    # The sessions table is created by create_all()
+    [],
+    [
+        "ALTER TABLE users ADD COLUMN reset_token_expires_at DATETIME",
+        "CREATE INDEX IF NOT EXISTS ix_users_reset_token_expires_at "
+        "ON users (reset_token_expires_at)",
+        "CREATE INDEX IF NOT EXISTS ix_sessions_expires_at "
+        "ON sessions (expires_at)",
+    ],
+    # users.session_id is replaced by the sessions table
+    ["DROP INDEX IF EXISTS ix_users_session_id"],
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# User ID of a session that hasn't expired at _now, run on every request:
+# built once, as building the statement costs more than running it
+SESSION_USER = select(UserSession.__table__.c.user_id).where(
+    UserSession.__table__.c.id == bindparam('_id'),
+    or_(UserSession.__table__.c.expires_at.is_(None),
+        UserSession.__table__.c.expires_at > bindparam('_now')))
+
+
+class UserCache:
+    """Bounded cache of user rows, by ID and by email
+
+    Entries expire after ttl seconds, the oldest are dropped beyond size
+    entries, and invalidate() drops every entry of a user. A row read
+    while an invalidation happened isn't cached, as it may be stale.
+
+    Invalidations only reach the cache of this process: other workers
+    may serve a changed row for up to ttl seconds, so password checks
+    and session validity are always read from the database
+    """
+
+    KEYS = ('id', 'email')
+
+    def __init__(self, size: int = DB_CACHE_SIZE,
+                 ttl: float = DB_CACHE_TTL) -> None:
+        """Initialize an empty cache
+        """
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.version = 0
+        self._entries = OrderedDict()
+        self._keys_of = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> dict:
+        """Row cached for a (column, value) key, or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: tuple, row: dict, version: int) -> None:
+        """Cache the row found for a (column, value) key, read when the
+        cache was at version
+        """
+        if self.size <= 0:
+            return
+        with self._lock:
+            if version != self.version:
+                return
+            self._drop(key)
+            self._entries[key] = (row, time.monotonic() + self.ttl)
+            self._keys_of.setdefault(row['id'], set()).add(key)
+            while len(self._entries) > self.size:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop every entry of a user
+        """
+        with self._lock:
+            self.version += 1
+            for key in list(self._keys_of.get(user_id, ())):
+                self._drop(key)
+
+    def _drop(self, key: tuple) -> None:
+        """Drop an entry, lock held
+        """
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys_of.get(entry[0]['id'])
+            keys.discard(key)
+            if not keys:
+                del self._keys_of[entry[0]['id']]
+
+    def stats(self) -> dict:
+        """Hits, misses and number of entries
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self._entries)}
 
 
 class DB:
@@ -18,20 +154,76 @@ class DB:
 
     def __init__(self) -> None:
         """Initialize a new DB instance
+
+        The database is recreated empty, unless DB_PERSIST=1: then the
+        existing data is kept and its schema upgraded.
+
+        Each thread gets its own session, from a pool of DB_POOL_SIZE
+        connections (plus DB_POOL_OVERFLOW), set up with the
+        DB_JOURNAL_MODE, DB_SYNCHRONOUS and DB_BUSY_TIMEOUT (ms) pragmas,
+        and with foreign keys enforced: deleting a user deletes their
+        sessions
+        """
+        self._engine = create_engine(
+            "sqlite:///{}".format(DB_PATH), echo=False,
+            pool_size=DB_POOL_SIZE, max_overflow=DB_POOL_OVERFLOW)
+        event.listen(self._engine, "connect", self._configure)
+        if not DB_PERSIST:
+            Base.metadata.drop_all(self._engine)
+        self.migrate()
+        factory = sessionmaker(bind=self._engine)
+        event.listen(factory, "after_commit", self._count_commit)
+        self.__session = scoped_session(factory)
+        self.commits = 0
+        self.cache = UserCache()
+        self._touched = {}
+        self._touched_at = time.monotonic()
+        self._touch_lock = threading.Lock()
+
+    def _count_commit(self, session: Session) -> None:
+        """Count the commits of every session
+        """
+        self.commits += 1
+
+    @staticmethod
+    def _configure(dbapi_connection, connection_record) -> None:
+        """Apply the SQLite pragmas to a new connection
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode={}".format(DB_JOURNAL_MODE))
+        cursor.execute("PRAGMA synchronous={}".format(DB_SYNCHRONOUS))
+        cursor.execute("PRAGMA busy_timeout={:d}".format(DB_BUSY_TIMEOUT))
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    def migrate(self) -> int:
+        """Create the tables, or upgrade them to SCHEMA_VERSION.
+
+        Returns:
+            int: The schema version the database was at.
         """
-        self._engine = create_engine("sqlite:///a.db", echo=False)
-        Base.metadata.drop_all(self._engine)
-        Base.metadata.create_all(self._engine)
-        self.__session = None
+        with self._engine.begin() as conn:
+            created = not inspect(conn).has_table(User.__tablename__)
+            version = conn.execute(text("PRAGMA user_version")).scalar()
+            Base.metadata.create_all(conn)
+            if not created:
+                for statements in MIGRATIONS[version:]:
+                    for statement in statements:
+                        conn.execute(text(statement))
+            conn.execute(text(
+                "PRAGMA user_version = {:d}".format(SCHEMA_VERSION)))
+        return version
 
     @property
     def _session(self) -> Session:
-        """Memoized session object
+        """Session object of the current thread
+        """
+        return self.__session()
+
+    def close(self) -> None:
+        """Release the session of the current thread and its connection
         """
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        self.__session.remove()
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """Add a new user to the database
@@ -52,26 +244,88 @@ class DB:
             user = None
         return user
 
-    def find_user_by(self, **kwargs) -> User:
+    def add_users(self, users: List[dict]) -> int:
+        """Add many users to the database in one transaction, ignoring
+        those whose email is already registered (INSERT OR IGNORE)
+
+        Args:
+            users (list): Dictionaries with the email and hashed_password
+            of each user
+
+        Returns:
+            int: The number of users added
+        """
+        if not users:
+            return 0
+        session = self._session
+        try:
+            count = session.execute(
+                insert(User.__table__).prefix_with("OR IGNORE"), [
+                    {'email': user['email'],
+                     'hashed_password': user['hashed_password']}
+                    for user in users]).rowcount
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        return count
+
+    def find_emails(self, emails: List[str]) -> Set[str]:
+        """Find which of the given emails are already registered, with
+        one query per 500 emails
+
+        Args:
+            emails (list): The emails to look up
+
+        Returns:
+            set: The emails found
+        """
+        email = User.__table__.columns.email
+        found = set()
+        for i in range(0, len(emails), 500):
+            found.update(self._session.execute(
+                select(email).where(email.in_(emails[i:i + 500]))).scalars())
+        return found
+
+    def find_user_by(self, cached: bool = True, **kwargs) -> User:
         """Find a user by arbitrary keyword arguments.
 
         Args:
+            cached (bool): False to read the user from the database even
+            if it is in the cache.
             **kwargs: Arbitrary keyword arguments representing filters for the
             query.
 
         Returns:
             User: The first user found matching the filters.
 
+        Lookups by ID or email alone go through the cache,
+        and return a User detached from any session.
+
         Raises:
             NoResultFound: If no user is found matching the filters.
             InvalidRequestError: If wrong query arguments are passed.
         """
+        key = None
+        if cached and len(kwargs) == 1:
+            key = next(iter(kwargs.items()))
+            if key[0] not in UserCache.KEYS or key[1] is None:
+                key = None
+        if key is not None:
+            row = self.cache.get(key)
+            if row is not None:
+                return User(**row)
+            version = self.cache.version
         session = self._session
         try:
             user = session.query(User).filter_by(**kwargs).one()
-            return user
         except (NoResultFound, InvalidRequestError):
             raise
+        if key is not None:
+            self.cache.put(key, {column.name: getattr(user, column.name)
+                                 for column in User.__table__.columns},
+                           version)
+        return user
 
         try:
             query_filters = {
@@ -86,8 +340,172 @@ class DB:
         except InvalidRequestError:
             raise InvalidRequestError()
 
+    def add_session(self, user_id: int, session_id: str,
+                    duration: int = 0) -> None:
+        """Add a session to a user, alongside their other sessions
+
+        Args:
+            user_id (int): The ID of the user
+            session_id (str): The session ID
+            duration (int): Seconds before it expires (never if 0)
+        """
+        now = datetime.utcnow()
+        session = self._session
+        try:
+            session.execute(insert(UserSession.__table__).values(
+                id=session_id, user_id=user_id, created_at=now,
+                last_seen_at=now,
+                expires_at=now + timedelta(seconds=duration)
+                if duration > 0 else None))
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+    def find_user_by_session(self, session_id: str) -> Union[None, User]:
+        """Find the user of a session that hasn't expired, and note that
+        the session was seen. The session is always looked up in the
+        database, so it ends in every worker as soon as it's deleted;
+        the user comes from the cache
+
+        Args:
+            session_id (str): The session ID
+
+        Returns:
+            User: The user, or None
+        """
+        user_id = self._session.execute(SESSION_USER, {
+            '_id': session_id, '_now': datetime.utcnow()}).scalar()
+        if user_id is None:
+            return None
+        try:
+            user = self.find_user_by(id=user_id)
+        except NoResultFound:
+            return None
+        self.touch_session(session_id)
+        return user
+
+    def touch_session(self, session_id: str) -> None:
+        """Note that a session was seen now; the last seen times are
+        written all at once, every DB_TOUCH_BATCH sessions or
+        DB_TOUCH_INTERVAL seconds
+
+        Args:
+            session_id (str): The session ID
+        """
+        with self._touch_lock:
+            self._touched[session_id] = datetime.utcnow()
+            if len(self._touched) < DB_TOUCH_BATCH and \
+               time.monotonic() - self._touched_at < DB_TOUCH_INTERVAL:
+                return
+        self.flush_touches()
+
+    def flush_touches(self) -> int:
+        """Write the pending last seen times in one statement
+
+        Returns:
+            int: The number of sessions written
+        """
+        with self._touch_lock:
+            touched, self._touched = self._touched, {}
+            self._touched_at = time.monotonic()
+        if not touched:
+            return 0
+        sessions = UserSession.__table__.columns
+        session = self._session
+        try:
+            session.execute(
+                update(UserSession.__table__)
+                .where(sessions.id == bindparam('_id'))
+                .values(last_seen_at=bindparam('_last_seen_at')),
+                [{'_id': session_id, '_last_seen_at': seen_at}
+                 for session_id, seen_at in touched.items()])
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        return len(touched)
+
+    def delete_sessions(self, user_id: int, session_id: str = None) -> int:
+        """Delete one session of a user, or all of them
+
+        Args:
+            user_id (int): The ID of the user
+            session_id (str): The session ID, None for every session
+
+        Returns:
+            int: The number of sessions deleted
+        """
+        sessions = UserSession.__table__.columns
+        statement = delete(UserSession.__table__).where(
+            sessions.user_id == user_id)
+        if session_id is not None:
+            statement = statement.where(sessions.id == session_id)
+        session = self._session
+        try:
+            count = session.execute(statement).rowcount
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        return count
+
+    def delete_expired_sessions(self, limit: int,
+                                now: datetime = None) -> int:
+        """Delete at most limit sessions expired by now, with a single
+        statement, so the write lock is held for one short transaction.
+
+        Args:
+            limit (int): The maximum number of sessions to delete
+            now (datetime): The current UTC time, by default utcnow()
+
+        Returns:
+            int: The number of sessions deleted
+        """
+        sessions = UserSession.__table__.columns
+        expired = select(sessions.id).where(
+            sessions.expires_at <= (now or datetime.utcnow())).limit(limit)
+        session = self._session
+        try:
+            count = session.execute(delete(UserSession.__table__).where(
+                sessions.id.in_(expired))).rowcount
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        return count
+
+    def clear_expired_reset_tokens(self, limit: int,
+                                   now: datetime = None) -> int:
+        """Clear at most limit reset tokens expired by now, with a single
+        statement, so the write lock is held for one short transaction.
+
+        Args:
+            limit (int): The maximum number of reset tokens to clear
+            now (datetime): The current UTC time, by default utcnow()
+
+        Returns:
+            int: The number of reset tokens cleared
+        """
+        columns = User.__table__.columns
+        expired = select(columns.id).where(
+            columns.reset_token_expires_at <= (now or datetime.utcnow())
+        ).limit(limit)
+        session = self._session
+        try:
+            count = session.execute(
+                update(User.__table__).where(columns.id.in_(expired))
+                .values(reset_token=None, reset_token_expires_at=None)
+            ).rowcount
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        return count
+
     def update_user(self, user_id: int, **kwargs) -> None:
-        """Update a user's attributes based on user_id.
+        """Update a user's attributes based on user_id, with a single
+        UPDATE statement in one transaction.
 
         Args:
             user_id (int): The ID of the user to update.
@@ -99,12 +517,56 @@ class DB:
         Raises:
             ValueError: If an invalid argument is passed.
             NoResultFound: If no user is found matching the user_id.
-            InvalidRequestError: If wrong query arguments are passed.
         """
-        user = self.find_user_by(id=user_id)
-        for key, value in kwargs.items():
-            if hasattr(User, key):
-                setattr(user, key, value)
-                self._session.commit()
-            else:
-                raise ValueError()
+        if not kwargs:
+            self.find_user_by(id=user_id)
+            return None
+        if self.update_users({user_id: kwargs}) == 0:
+            raise NoResultFound()
+
+    def update_users(self, changes: Dict[int, dict]) -> int:
+        """Update the attributes of many users in one transaction.
+
+        Users updated with the same attributes share one UPDATE
+        statement, executed once per user.
+
+        Args:
+            changes (dict): Attributes to set, by user ID.
+
+        Returns:
+            int: The number of users updated.
+
+        Raises:
+            ValueError: If an invalid attribute is passed.
+        """
+        columns = User.__table__.columns
+        statements = {}
+        for user_id, values in changes.items():
+            for key in values:
+                if key not in columns or key == 'id':
+                    raise ValueError()
+            params = {'_' + key: value for key, value in values.items()}
+            params['_id'] = user_id
+            statements.setdefault(tuple(sorted(values)), []).append(params)
+        session = self._session
+        count = 0
+        for user_id in changes:
+            self.cache.invalidate(user_id)
+        try:
+            for keys, params in statements.items():
+                if not keys:
+                    continue
+                result = session.execute(
+                    update(User.__table__)
+                    .where(columns.id == bindparam('_id'))
+                    .values({key: bindparam('_' + key) for key in keys}),
+                    params)
+                count += result.rowcount
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            for user_id in changes:
+                self.cache.invalidate(user_id)
+        return count
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+""" Bulk registration of users from a NDJSON or CSV file
+
+Each record has an email and either a password or a bcrypt
+hashed_password; records without them are counted as invalid and
+skipped, like the emails already registered. The database is kept
+(DB_PERSIST=1) unless set otherwise.
+
+Usage: python3 import_users.py <users.ndjson|users.csv> [batch size]
+"""
+import csv
+import json
+import os
+import sys
+import time
+from typing import Iterator
+
+
+def read_users(file_path: str) -> Iterator[dict]:
+    """ Yield the records of a .csv file (with a header line), or of a
+    file with one JSON object per line
+    """
+    with open(file_path, newline='') as f:
+        if file_path.endswith('.csv'):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python3 import_users.py <file> [batch size]")
+        sys.exit(1)
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    os.environ.setdefault("DB_PERSIST", "1")
+    from auth import Auth
+
+    start = time.perf_counter()
+    stats = Auth().register_users(read_users(sys.argv[1]), batch_size)
+    seconds = time.perf_counter() - start
+    total = stats['created'] + stats['skipped'] + stats['invalid']
+    print("{} users created, {} skipped, {} invalid in {:.1f}s: "
+          "{:.0f} users/sec".format(stats['created'], stats['skipped'],
+                                    stats['invalid'], seconds,
+                                    total / seconds))
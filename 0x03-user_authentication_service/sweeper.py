@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Sweeper module
+"""
+from datetime import datetime
+import threading
+import time
+
+from db import DB, DB_SWEEP_BATCH, DB_SWEEP_INTERVAL
+
+
+class Sweeper(threading.Thread):
+    """Background thread deleting the expired sessions and clearing the
+    expired reset tokens of a DB every interval seconds
+
+    Each statement touches at most batch_size rows and commits, so the
+    sweeper never holds the SQLite write lock for long: the requests
+    write between its batches. The pending last seen times of the
+    sessions are flushed on each run too.
+    """
+
+    def __init__(self, db: DB, interval: float = DB_SWEEP_INTERVAL,
+                 batch_size: int = DB_SWEEP_BATCH) -> None:
+        """Initialize a Sweeper of db
+        """
+        super().__init__(name="sweeper", daemon=True)
+        self.db = db
+        self.interval = interval
+        self.batch_size = max(batch_size, 1)
+        self.runs = 0
+        self.errors = 0
+        self.batches = 0
+        self.max_batch_ms = 0.0
+        self.last_run = {}
+        self.totals = {'sessions': 0, 'reset_tokens': 0, 'touches': 0}
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        """Sweep every interval seconds, until stopped
+        """
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:
+                self.errors += 1
+            finally:
+                self.db.close()
+
+    def stop(self) -> None:
+        """Stop sweeping, after the current run
+        """
+        self._stopped.set()
+
+    def sweep(self) -> dict:
+        """Flush the last seen times, then remove what expired before
+        this run started, one batch at a time
+
+        Returns:
+            dict: The number of sessions deleted, reset tokens cleared
+                and last seen times written, and the run time.
+        """
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        counts = {'touches': self.db.flush_touches()}
+        for key, remove in (
+                ('sessions', self.db.delete_expired_sessions),
+                ('reset_tokens', self.db.clear_expired_reset_tokens)):
+            counts[key] = 0
+            while True:
+                batch_started = time.perf_counter()
+                count = remove(self.batch_size, now)
+                self.max_batch_ms = max(
+                    self.max_batch_ms,
+                    (time.perf_counter() - batch_started) * 1000)
+                self.batches += 1
+                counts[key] += count
+                if count < self.batch_size:
+                    break
+        for key, count in counts.items():
+            self.totals[key] += count
+        counts['duration_ms'] = round(
+            (time.perf_counter() - started) * 1000, 3)
+        counts['at'] = now.isoformat()
+        self.runs += 1
+        self.last_run = counts
+        return counts
+
+    def stats(self) -> dict:
+        """Runs, errors, batches, longest batch, rows removed so far and
+        the last run
+        """
+        return {'runs': self.runs, 'errors': self.errors,
+                'batches': self.batches,
+                'max_batch_ms': round(self.max_batch_ms, 3),
+                'totals': dict(self.totals), 'last_run': self.last_run}
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+""" Tests of the statements and commits of the DB updates
+
+Usage: python3 -m unittest discover tests
+"""
+from sqlalchemy import event
+from sqlalchemy.orm.exc import NoResultFound
+from unittest import mock
+import os
+import tempfile
+import unittest
+
+import auth
+from auth import Auth
+
+
+class TestUpdates(unittest.TestCase):
+    """ Each update is a single UPDATE statement and a single commit
+    """
+
+    def setUp(self):
+        """ A new database in an empty directory, without hash workers
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        patcher = mock.patch.object(auth, 'HASH_WORKERS', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.auth = Auth()
+        self.db = self.auth._db
+        self.updates = 0
+        event.listen(self.db._engine, "before_cursor_execute",
+                     self.count_update)
+
+    def tearDown(self):
+        """ Drop the database
+        """
+        self.db.close()
+        self.db._engine.dispose()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def count_update(self, conn, cursor, statement, *args):
+        """ Count the UPDATE statements sent to SQLite
+        """
+        if statement.lstrip().upper().startswith("UPDATE"):
+            self.updates += 1
+
+    def add_users(self, count: int) -> list:
+        """ IDs of count new users
+        """
+        self.db.add_users([{'email': "user{}@holberton.io".format(i),
+                            'hashed_password': b"hash"}
+                           for i in range(count)])
+        return [self.db.find_user_by(email="user{}@holberton.io".format(i)).id
+                for i in range(count)]
+
+    def assertCounts(self, commits: int, updates: int):
+        """ Check the commits and UPDATE statements since the last check
+        """
+        self.assertEqual((self.db.commits - self.commits, self.updates),
+                         (commits, updates))
+        self.commits = self.db.commits
+        self.updates = 0
+
+    def start_counting(self):
+        """ Count from now on
+        """
+        self.commits = self.db.commits
+        self.updates = 0
+
+    def test_update_user(self):
+        """ Several attributes: one UPDATE, one commit
+        """
+        user_id, = self.add_users(1)
+        self.start_counting()
+        self.db.update_user(user_id, session_id="s", reset_token="t")
+        self.assertCounts(1, 1)
+        user = self.db.find_user_by(cached=False, id=user_id)
+        self.assertEqual((user.session_id, user.reset_token), ("s", "t"))
+
+    def test_update_user_without_attributes(self):
+        """ Nothing to update: no UPDATE, no commit, but the user must
+        exist
+        """
+        user_id, = self.add_users(1)
+        self.start_counting()
+        self.assertIsNone(self.db.update_user(user_id))
+        self.assertCounts(0, 0)
+        with self.assertRaises(NoResultFound):
+            self.db.update_user(user_id + 1)
+
+    def test_update_user_errors(self):
+        """ Unknown user or attribute
+        """
+        user_id, = self.add_users(1)
+        with self.assertRaises(NoResultFound):
+            self.db.update_user(user_id + 1, session_id="s")
+        with self.assertRaises(ValueError):
+            self.db.update_user(user_id, unknown="x")
+
+    def test_update_users(self):
+        """ Many users: one UPDATE per set of attributes, one commit
+        """
+        user_ids = self.add_users(100)
+        changes = {user_id: {'session_id': "s{}".format(user_id)}
+                   for user_id in user_ids[:60]}
+        changes.update({user_id: {'reset_token': "t{}".format(user_id)}
+                        for user_id in user_ids[60:]})
+        self.start_counting()
+        self.assertEqual(self.db.update_users(changes), 100)
+        self.assertCounts(1, 2)
+
+    def test_update_password(self):
+        """ New reset token, then new password: one UPDATE and one
+        commit each
+        """
+        self.auth.register_user("bob@holberton.io", "old")
+        self.start_counting()
+        token = self.auth.get_reset_password_token("bob@holberton.io")
+        self.assertCounts(1, 1)
+        self.auth.update_password(token, "new")
+        self.assertCounts(1, 1)
+        self.assertTrue(self.auth.valid_login("bob@holberton.io", "new"))
+        with self.assertRaises(ValueError):
+            self.auth.update_password(token, "other")
+
+    def test_register_users(self):
+        """ The records are left as they are, the invalid ones and the
+        emails registered meanwhile are skipped
+        """
+        self.auth.register_user("bob@holberton.io", "pwd")
+        users = [{'email': "bob@holberton.io", 'hashed_password': "hash"},
+                 {'email': "amy@holberton.io", 'password': "pwd"},
+                 {'email': "amy@holberton.io", 'password': "other"},
+                 {'email': "eve@holberton.io"},
+                 {'password': "pwd"}]
+        copies = [dict(user) for user in users]
+        with mock.patch.object(self.db, 'find_emails', return_value=set()):
+            stats = self.auth.register_users(users)
+        self.assertEqual(stats, {'created': 1, 'skipped': 2, 'invalid': 2})
+        self.assertEqual(users, copies)
+        self.assertTrue(self.auth.valid_login("amy@holberton.io", "pwd"))
+        self.assertTrue(self.auth.valid_login("bob@holberton.io", "pwd"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """ User authentication service project (0x03) """
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -11,7 +11,25 @@ class User(Base):
     __tablename__ = 'users'
 
     id = Column(Integer, primary_key=True)
-    email = Column(String(250), nullable=False)
+    email = Column(String(250), nullable=False, unique=True, index=True)
     hashed_password = Column(String(250), nullable=False)
+    # Sessions are in the sessions table: this column is no longer used
     session_id = Column(String(250), nullable=True)
-    reset_token = Column(String(250), nullable=True)
+    reset_token = Column(String(250), nullable=True, index=True)
+    reset_token_expires_at = Column(DateTime, nullable=True, index=True)
+
+
+class UserSession(Base):
+    """ SQLAlchemy model named UserSession for a database table named
+    sessions: the sessions of the users, many per user """
+    __tablename__ = 'sessions'
+    # The rows are stored in the primary key index: it covers the
+    # session_id -> user lookup on its own
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    id = Column(String(250), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'),
+                     nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False)
+    last_seen_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=True, index=True)